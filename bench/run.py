@@ -0,0 +1,249 @@
+# IPP 2022/23
+# Benchmarks of the IPPcode23 interpreter
+# Author: Matyas Strelec (xstrel03)
+#
+# Runs representative workloads and reports wall time, executed instructions per second
+# and peak RSS. With --baseline, every workload is also run by another revision of
+# interpret.py (git revision or path) and the ratios are reported.
+#
+#   python3 bench/run.py
+#   python3 bench/run.py --baseline HEAD~3 --args=--engine=compiled
+#   python3 bench/run.py --filter recursion --repeat 5
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+import argparse
+import glob
+import hashlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+WORKLOADS_DIR = os.path.join(BENCH_DIR, 'workloads')
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Conversion of IPPcode23 source to its XML representation (the job of parse.php)
+class Source:
+    # Opcodes with label as the first argument
+    _label_opcodes = ['LABEL', 'JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'CALL']
+
+    # Generates the XML line by line, the source is an iterable of lines
+    @staticmethod
+    def to_xml(source):
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n<program language="IPPcode23">\n'
+        order = 0
+        for line in source:
+            line = line.split('#')[0].strip()
+            if(line == '' or line.startswith('.')):
+                continue
+
+            tokens = line.split()
+            opcode = tokens[0].upper()
+            order += 1
+            lines = ['<instruction order="%d" opcode="%s">' % (order, opcode)]
+            for i, token in enumerate(tokens[1:], 1):
+                arg_type, value = Source._argument(opcode, i, token)
+                lines.append('<arg%d type="%s">%s</arg%d>' % (i, arg_type, escape(value), i))
+            lines.append('</instruction>\n')
+            yield '\n'.join(lines)
+        yield '</program>\n'
+
+    @staticmethod
+    def _argument(opcode, position, token):
+        if(position == 1 and opcode in Source._label_opcodes):
+            return 'label', token
+        if(position == 2 and opcode == 'READ'):
+            return 'type', token
+        prefix, _, value = token.partition('@')
+        if(prefix in ['GF', 'LF', 'TF']):
+            return 'var', token
+        return prefix, value
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Workload, IPPcode23 program with optional input, both are generated only when written
+# so that the runner stays small (peak RSS of the children includes the RSS of the runner)
+class Workload:
+    def __init__(self, name, source, input_data=None):
+        self.name = name
+        self.source = source            # Function returning lines of the program
+        self.input_data = input_data    # Function returning lines of the input
+        self.instructions = None        # Number of executed instructions
+
+    # Write program in XML and input to the directory, returns their paths
+    def write(self, directory):
+        source = os.path.join(directory, self.name + '.xml')
+        with open(source, 'w') as file:
+            file.writelines(Source.to_xml(self.source()))
+        data = os.path.join(directory, self.name + '.in')
+        with open(data, 'w') as file:
+            if(self.input_data is not None):
+                file.writelines(self.input_data())
+        return source, data
+
+    # Workloads stored in bench/workloads
+    @staticmethod
+    def from_directory(directory):
+        workloads = []
+        for path in sorted(glob.glob(os.path.join(directory, '*.IPPcode23'))):
+            name = os.path.basename(path)[:-len('.IPPcode23')]
+            input_path = path[:-len('.IPPcode23')] + '.in'
+            input_data = None
+            if(os.path.exists(input_path)):
+                input_data = lambda input_path=input_path: open(input_path)
+            workloads.append(Workload(name, lambda path=path: open(path), input_data))
+        return workloads
+
+    # Huge program without any jumps
+    @staticmethod
+    def straight_line(size):
+        def source():
+            yield from ['DEFVAR GF@a', 'DEFVAR GF@b', 'DEFVAR GF@s', 'MOVE GF@a int@0', 'MOVE GF@b int@1']
+            for i in range(size // 4):
+                yield 'ADD GF@a GF@a int@%d' % (i % 100)
+                yield 'SUB GF@b GF@a GF@b'
+                yield 'MOVE GF@s string@x%d\\032' % i
+                yield 'PUSHS GF@b'
+            yield 'WRITE GF@a'
+            yield 'WRITE GF@s'
+        return Workload('straight_line', source)
+
+    # Input for the READ loop, pairs of integer and string lines
+    @staticmethod
+    def read_input(lines):
+        return lambda: ('%d\nline\\032number\\032%d\n' % (i, i) for i in range(lines))
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Interpreter revision, interpret.py in the working tree, at a git revision or at a path
+class Interpreter:
+    def __init__(self, name, path, args):
+        self.name = name
+        self.path = path
+        self.args = args
+
+    @staticmethod
+    def from_revision(revision, directory, args):
+        if(os.path.isfile(revision)):
+            return Interpreter(revision, os.path.abspath(revision), args)
+        path = os.path.join(directory, 'interpret-%s.py' % hashlib.sha1(revision.encode()).hexdigest()[:8])
+        source = subprocess.run(['git', '-C', REPO_DIR, 'show', revision + ':interpret.py'],
+                                check=True, capture_output=True).stdout
+        with open(path, 'wb') as file:
+            file.write(source)
+        return Interpreter(revision, path, args)
+
+    # Run the workload once, returns exit code, wall time, peak RSS in bytes and output hash
+    def run(self, source, data):
+        command = [sys.executable, self.path, '--source', source, '--input', data] + self.args
+        with tempfile.TemporaryFile() as output:
+            start = time.perf_counter()
+            process = subprocess.Popen(command, stdout=output, stderr=subprocess.DEVNULL)
+            _, status, usage = os.wait4(process.pid, 0)
+            wall = time.perf_counter() - start
+            process.returncode = os.waitstatus_to_exitcode(status)
+            output.seek(0)
+            digest = hashlib.sha1(output.read()).hexdigest()
+
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+        return process.returncode, wall, rss, digest
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Count executed instructions by running the workload in the interpreter of the working tree,
+# done in a child process to keep the runner small
+def count_instructions(source, data):
+    command = [sys.executable, os.path.abspath(__file__), '--count', source, data]
+    return int(subprocess.run(command, check=True, capture_output=True).stdout)
+
+
+def _count_instructions(source, data):
+    sys.path.insert(0, REPO_DIR)
+    import interpret
+
+    with open(source) as source_file, open(data) as input_file:
+        xml = interpret.Xml(source_file)
+        xml.parser()
+        program = interpret.Prog(input_file, output=interpret.Output(io.StringIO()), optimize=False)
+        program.load(xml.get_instructions())
+
+        instructions = program.instructions
+        count = 0
+        try:
+            while(program.current_instruction < len(instructions)):
+                instructions[program.current_instruction].execute(program)
+                program.current_instruction += 1
+                count += 1
+        except(interpret.ProgramExit):
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench/run.py', description='Benchmarks of the IPPcode23 interpreter.')
+    parser.add_argument('--baseline', help='Git revision or path of interpret.py to compare with')
+    parser.add_argument('--args', help='Arguments for the interpreter, e.g. --args=--engine=compiled', default='')
+    parser.add_argument('--baseline-args', help='Arguments for the baseline interpreter', default='')
+    parser.add_argument('--repeat', help='Number of runs of every workload, the median is reported', type=int, default=3)
+    parser.add_argument('--filter', help='Run only workloads with name containing this text', default='')
+    parser.add_argument('--size', help='Number of instructions of the straight line workload', type=int, default=200000)
+    parser.add_argument('--lines', help='Number of input line pairs of the READ workload', type=int, default=50000)
+    parser.add_argument('--count', help=argparse.SUPPRESS, nargs=2)
+    args = parser.parse_args()
+
+    if(args.count is not None):
+        print(_count_instructions(*args.count))
+        return
+
+    workloads = Workload.from_directory(WORKLOADS_DIR)
+    for workload in workloads:
+        if(workload.name == 'read_loop' and workload.input_data is None):
+            workload.input_data = Workload.read_input(args.lines)
+    workloads.append(Workload.straight_line(args.size))
+    workloads = [workload for workload in workloads if args.filter in workload.name]
+
+    with tempfile.TemporaryDirectory() as directory:
+        interpreters = [Interpreter('working tree', os.path.join(REPO_DIR, 'interpret.py'), args.args.split())]
+        if(args.baseline is not None):
+            interpreters.append(Interpreter.from_revision(args.baseline, directory, args.baseline_args.split()))
+
+        print('%-14s %-14s %10s %12s %9s' % ('workload', 'interpreter', 'time [s]', 'instr/s', 'RSS [MB]'))
+        failed = False
+        for workload in workloads:
+            source, data = workload.write(directory)
+            workload.instructions = count_instructions(source, data)
+
+            results = []
+            for interpreter in interpreters:
+                runs = [interpreter.run(source, data) for _ in range(args.repeat)]
+                wall = statistics.median(run[1] for run in runs)
+                rss = max(run[2] for run in runs)
+                codes = set(run[0] for run in runs)
+                digests = set(run[3] for run in runs)
+                results.append((wall, rss, digests))
+
+                note = '' if codes == {0} else '  exit code %s' % ', '.join(str(code) for code in sorted(codes))
+                failed = failed or note != ''
+                print('%-14s %-14s %10.3f %12.0f %9.1f%s' % (workload.name, interpreter.name[:14], wall,
+                                                             workload.instructions / wall, rss / 2**20, note))
+
+            if(len(results) == 2):
+                (wall, rss, digests), (base_wall, base_rss, base_digests) = results
+                note = '' if digests == base_digests else '  OUTPUT DIFFERS'
+                failed = failed or note != ''
+                print('%-14s %-14s %9.2fx %12s %8.2fx%s' % ('', 'speedup', base_wall / wall, '', rss / base_rss, note))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
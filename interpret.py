@@ -5,7 +5,23 @@
 # ------------------–------------------–------------------–------------------–------------------ #
 
 import argparse
+import contextlib
+import gc
+import hashlib
+import io
+import itertools
+import json
+import marshal
+import multiprocessing
+import operator
+import os
+import signal
+import socket
+import stat
 import sys
+import tempfile
+import time
+import traceback
 import xml.etree.ElementTree as etree
 from enum import Enum
 
@@ -13,28 +29,177 @@ from enum import Enum
 
 # Main program class
 class Prog:
-    def __init__(self, input_file):
+    # Most names of temporary and local frame variables for frames as lists, more names keep dictionaries
+    FRAME_SLOTS = 64
+
+    def __init__(self, input_file, engine='interpret', gf_slots=False, output=None, stats=None, optimize=True, dump=None, tracer=None,
+                 memo=None, freeze=False):
         self.gf = {}            # Global frame
+        self.gf_slots = None    # Global frame as list indexed by Var.slot (None = not defined)
+        self._use_gf_slots = gf_slots or engine == 'aot' or tracer is not None     # Translated code uses the slots
         self.tf = None          # Temporary frame
         self.lf = []            # Local frame
+        self.frame_size = None  # Length of temporary and local frames as lists indexed by Var.slot (None = dictionaries)
         self.instructions = []
         self.current_instruction = 0
         self.stack = []         # Data stack
-        self.labels = []
+        self.labels = {}        # Label name -> instruction index
         self.callstack = []     # Call stack (for CALL and RETURN)
-        self.input = input_file # Input file (for READ)
-
-    # Start interpreting the program
-    def run(self, instructions):
+        self.input = input_file if isinstance(input_file, Input) else Input(input_file)    # Program input (for READ)
+        self.output = output if output is not None else Output(sys.stdout)  # Program output (for WRITE)
+        self.engine = engine    # 'interpret', 'compiled' or 'aot'
+        self.stats = stats      # Execution statistics, None = not collected
+        self.optimize = optimize    # Optimize the loaded program (constant folding, superinstructions, ...)
+        self.dump = dump        # File for the translated program (aot engine), None = not written
+        self.tracer = tracer    # Tracing of hot loops (interpret and compiled engine), None = not traced
+        self.memo = memo        # Results of pure functions, None = calls are not memoized
+        self.freeze = freeze    # Loaded program and its code are frozen by gc.freeze() (for the process of one run)
+
+    # Prepare instructions for running, labels are given when targets are already resolved (cached program)
+    def load(self, instructions, labels=None):
         self.instructions = instructions
 
-        # Find all labels to prevent redefinition
-        self._get_labels(self.instructions)
+        # Find all labels to prevent redefinition, resolve jump and call targets
+        if(labels is None):
+            self._get_labels(self.instructions)
+            self._resolve_labels(self.instructions)
+        else:
+            self.labels = labels
+        if(self._use_gf_slots):
+            self._resolve_globals(self.instructions)
+        self._resolve_frames(self.instructions)
+        if(self.optimize):
+            # Superinstructions do not form reference cycles, same as in Xml.parser
+            gc.disable()
+            try:
+                Optimizer(self).optimize(self.instructions)
+            finally:
+                gc.enable()
+        if(self.memo is not None):
+            self.memo.frame_size = self.frame_size
+            self.memo.functions = len(Purity(self.instructions).mark())
+
+        # Program is kept until the end, the cycle collector does not have to rescan it during the run
+        # (freezing is global for the process and is not undone, so it is only done when asked for)
+        if(self.freeze):
+            gc.freeze()
+
+    # Parse the XML source and load it, the cache is used when given (parsed programs are stored in it)
+    def load_source(self, source_file, stream=False, cache=None):
+        cached = None
+        if(cache is not None):
+            source = source_file.read()
+            source_file = io.BytesIO(source) if isinstance(source, bytes) else io.StringIO(source)
+            key = cache.key(source)
+            cached = cache.load(key)
+
+        if(cached is not None):
+            self.load(*cached)
+            return
+
+        # Parse XML file
+        xml = Xml(source_file, stream)
+        xml.parser()
+
+        # Get instructions from XML
+        self.load(xml.get_instructions())
+        if(cache is not None):
+            cache.store(key, self.instructions, self.labels)
+
+    # Start interpreting the program, returns exit code given by EXIT, errors raise InterpretError
+    # With limits, the run ends with error of the exceeded limit (see Limits)
+    def run(self, instructions=None, limits=None):
+        if(instructions is not None):
+            self.load(instructions)
+        instructions = self.instructions
 
         self.current_instruction = 0
-        while(self.current_instruction < len(instructions)):
-            instructions[self.current_instruction].execute(self)
-            self.current_instruction += 1
+        try:
+            # Instrumented and limited runs are separate loops, so the others stay the same without them
+            if(self.stats is not None):
+                self._run_stats(limits)
+            elif(limits is not None):
+                self._run_limited(limits)
+            elif(self.tracer is not None and self.engine != 'aot'):
+                self._run_traced()
+            elif(self.engine == 'compiled'):
+                self._run_compiled()
+            elif(self.engine == 'aot'):
+                Translator(self).compile(self.instructions, self.dump)(self)
+            else:
+                while(self.current_instruction < len(instructions)):
+                    instructions[self.current_instruction].execute(self)
+                    self.current_instruction += 1
+            return 0
+        except(ProgramExit) as exit:
+            return exit.code
+        finally:
+            # Program ends by EXIT (also the implicit one), error or exception
+            self.output.flush()
+            if(self.stats is not None):
+                self.stats.write()
+
+    # Run the program compiled into closures, each returns index of the next instruction
+    def _run_compiled(self):
+        code = Compiler(self).compile(self.instructions)
+        if(self.optimize):
+            self._skip_labels(code)
+
+        index = 0
+        end = len(code)
+        while(index < end):
+            index = code[index]()
+
+    # Instructions falling through to a label continue directly with the instruction after it,
+    # weights of instructions (see Limits.run) then count the skipped label too
+    def _skip_labels(self, code, weights=None):
+        for i in range(len(code) - 2, -1, -1):
+            if(self.instructions[i].opcode == 'LABEL'):
+                code[i] = code[i + 1]
+                if(weights is not None):
+                    weights[i] += weights[i + 1]
+
+    # Run the program and collect statistics, the interpreter is used through the generic closures
+    # Superinstructions are split back to the instructions they were made of, so that every one of them
+    # is counted (tail calls stay, the statistics count them), closures of the instructions check the limits
+    def _run_stats(self, limits=None):
+        compiler = Compiler(self)
+        instructions = [self._unfused(instruction) for instruction in self.instructions]
+        if(self.engine == 'compiled'):
+            code = compiler.compile(instructions)
+        else:
+            code = [Instruction.compile(instructions[i], compiler, i) for i in range(len(instructions))]
+        if(limits is not None):
+            code = limits.limited(self, code, instructions)
+        self.stats.run(self, code, instructions)
+
+    @staticmethod
+    def _unfused(instruction):
+        while(isinstance(instruction, Superinstruction) and len(instruction.fused) > 1 and
+              not isinstance(instruction, TAILCALL)):
+            instruction = instruction.fused[0]
+        return instruction
+
+    # Run the program by closures of the engine with limits of resources, the aot engine and traces
+    # are not used, as they run whole loops without returning to the loop which checks the limits
+    def _run_limited(self, limits):
+        compiler = Compiler(self)
+        if(self.engine != 'interpret'):
+            code = compiler.compile(self.instructions)
+        else:
+            code = [Instruction.compile(self.instructions[i], compiler, i) for i in range(len(self.instructions))]
+        limits.run(self, code, self.engine != 'interpret' and self.optimize)
+
+    # Run the program by closures of the engine, hot loops are run by compiled traces
+    def _run_traced(self):
+        compiler = Compiler(self)
+        if(self.engine == 'compiled'):
+            code = compiler.compile(self.instructions)
+            if(self.optimize):
+                self._skip_labels(code)
+        else:
+            code = [Instruction.compile(self.instructions[i], compiler, i) for i in range(len(self.instructions))]
+        self.tracer.run(self, code)
 
     # Get all labels from the program
     def _get_labels(self, instructions):
@@ -42,14 +207,61 @@ class Prog:
             if(instructions[i].opcode == 'LABEL'):
                 if(instructions[i].args[0].data in self.labels):
                     Helper.error_exit("Label already defined", Errors.SEMANTIC_CHECKS.value, self)
-                self.labels.append(instructions[i].args[0].data)
+                self.labels[instructions[i].args[0].data] = i
+
+    # Resolve label of every jump and call to its index, so branches do not search the program
+    def _resolve_labels(self, instructions):
+        for i in range(len(instructions)):
+            if(instructions[i].opcode in Helper.Branches):
+                index = self.find_label_index(instructions[i].args[0].data)
+                if(index == -1):
+                    self.current_instruction = i
+                    Helper.error_exit("Label not found", Errors.SEMANTIC_CHECKS.value, self)
+                instructions[i].target = index
+
+    # Give every global variable a fixed slot in the global frame list
+    def _resolve_globals(self, instructions):
+        slots = {}
+        for instruction in instructions:
+            for arg in instruction.args:
+                if(isinstance(arg, Var) and arg.frame == 'GF'):
+                    arg.slot = slots.setdefault(arg.name, len(slots))
+        self.gf_slots = [None] * len(slots)
+
+    # Give every temporary and local frame variable a fixed slot in the frame list
+    # Frame made by the caller becomes the local frame of the function, so the slots are the same in all
+    # functions and every frame has slots of all the names
+    def _resolve_frames(self, instructions):
+        variables = [arg for instruction in instructions for arg in instruction.args
+                     if isinstance(arg, Var) and arg.frame != 'GF']
+        slots = {}
+        for var in variables:
+            slots.setdefault(var.name, len(slots))
+        if(len(slots) > Prog.FRAME_SLOTS):
+            return
+        for var in variables:
+            var.slot = slots[var.name]
+        self.frame_size = len(slots)
+
+    # New empty temporary frame
+    def new_frame(self):
+        if(self.frame_size is None):
+            return {}
+        return [None] * self.frame_size
+
+    # Key of variable in temporary or local frame
+    def _frame_key(self, var):
+        return var.name if self.frame_size is None else var.slot
+
+    # Value of variable in temporary or local frame, None when it is not defined
+    def frame_value(self, frame, var):
+        if(self.frame_size is None):
+            return frame.get(var.name)
+        return frame[var.slot]
 
     # Find label index in the program for jumps and calls
     def find_label_index(self, label):
-        for i in range(len(self.instructions)):
-            if(self.instructions[i].opcode == 'LABEL' and self.instructions[i].args[0].data == label):
-                return i
-        return -1
+        return self.labels.get(label, -1)
 
     # Return value of variable or constant
     def get_symb(self, symb):
@@ -67,15 +279,18 @@ class Prog:
         if(self._is_var_defined(var)):
             Helper.error_exit("Variable already defined", Errors.SEMANTIC_CHECKS.value, self)
         if(var.frame == 'GF'):
-            self.gf[var.name] = Const(None)
+            if(self.gf_slots is not None):
+                self.gf_slots[var.slot] = UNDEFINED
+            else:
+                self.gf[var.name] = UNDEFINED
         elif(var.frame == 'TF'):
             if(self.tf is not None):
-                self.tf[var.name] = Const(None)
+                self.tf[self._frame_key(var)] = UNDEFINED
             else:
                 Helper.error_exit("Frame not defined", Errors.NONEXISTENT_FRAME.value, self)
         elif(var.frame == 'LF'):
             if(len(self.lf) > 0):
-                self.lf[-1][var.name] = Const(None)
+                self.lf[-1][self._frame_key(var)] = UNDEFINED
             else:
                 Helper.error_exit("Frame not defined", Errors.NONEXISTENT_FRAME.value, self)
         else:
@@ -84,19 +299,21 @@ class Prog:
     # Check if variable is defined in given frame
     def _is_var_defined(self, var):
         if(var.frame == 'GF'):
+            if(self.gf_slots is not None):
+                return self.gf_slots[var.slot] is not None
             if(var.name in self.gf):
                 return True
             else:
                 return False
         elif(var.frame == 'TF'):
             if(self.tf is not None):
-                if(var.name in self.tf):
+                if(self.frame_value(self.tf, var) is not None):
                     return True
                 else:
                     return False
         elif(var.frame == 'LF'):
             if(len(self.lf) > 0):
-                if(var.name in self.lf[-1]):
+                if(self.frame_value(self.lf[-1], var) is not None):
                     return True
                 else:
                     return False
@@ -105,15 +322,17 @@ class Prog:
     # Read variable data from frame
     def read_from_var(self, var):
         if(var.frame == 'GF'):
+            if(self.gf_slots is not None):
+                return self.gf_slots[var.slot].data
             return self.gf[var.name].data
         elif(var.frame == 'TF'):
             if(self.tf is not None):
-                return self.tf[var.name].data
+                return self.tf[self._frame_key(var)].data
             else:
                 Helper.error_exit("Variable not defined", Errors.NONEXISTENT_VARIABLE.value, self)
         elif(var.frame == 'LF'):
             if(len(self.lf) > 0):
-                return self.lf[-1][var.name].data
+                return self.lf[-1][self._frame_key(var)].data
             else:
                 Helper.error_exit("Variable not defined", Errors.NONEXISTENT_VARIABLE.value, self)
             Helper.error_exit("Variable not defined", Errors.NONEXISTENT_VARIABLE.value, self)
@@ -123,6 +342,11 @@ class Prog:
     # Read variable (the object) from frame
     def read_var_obj(self, var):
         if(var.frame == 'GF'):
+            if(self.gf_slots is not None):
+                value = self.gf_slots[var.slot]
+                if(value is not None):
+                    return value
+                Helper.error_exit("Variable not defined", Errors.NONEXISTENT_VARIABLE.value, self)
             if(self._is_var_defined(var)):
                 return self.gf[var.name]
             else:
@@ -130,7 +354,7 @@ class Prog:
         elif(var.frame == 'TF'):
             if(self.tf is not None):
                 if(self._is_var_defined(var)):
-                    return self.tf[var.name]
+                    return self.tf[self._frame_key(var)]
                 else:
                     Helper.error_exit("Variable not defined", Errors.NONEXISTENT_VARIABLE.value, self)
             else:
@@ -138,7 +362,7 @@ class Prog:
         elif(var.frame == 'LF'):
             if(len(self.lf) > 0):
                 if(self._is_var_defined(var)):
-                    return self.lf[-1][var.name]
+                    return self.lf[-1][self._frame_key(var)]
                 else:
                     Helper.error_exit("Variable not defined", Errors.NONEXISTENT_VARIABLE.value, self)
             else:
@@ -149,6 +373,11 @@ class Prog:
     # Write data to variable
     def write_to_var(self, var, data):
         if(var.frame == 'GF'):
+            if(self.gf_slots is not None):
+                if(self.gf_slots[var.slot] is not None):
+                    self.gf_slots[var.slot] = data
+                    return
+                Helper.error_exit("Variable not defined", Errors.NONEXISTENT_VARIABLE.value, self)
             if(self._is_var_defined(var)):
                 self.gf[var.name] = data
                 return
@@ -157,7 +386,7 @@ class Prog:
         elif(var.frame == 'TF'):
             if(self.tf is not None):
                 if(self._is_var_defined(var)):
-                    self.tf[var.name] = data
+                    self.tf[self._frame_key(var)] = data
                     return
                 else:
                     Helper.error_exit("Variable not defined", Errors.NONEXISTENT_VARIABLE.value, self)
@@ -166,7 +395,7 @@ class Prog:
         elif(var.frame == 'LF'):
             if(len(self.lf) > 0):
                 if(self._is_var_defined(var)):
-                    self.lf[-1][var.name] = data
+                    self.lf[-1][self._frame_key(var)] = data
                     return
                 else:
                     Helper.error_exit("Frame not defined", Errors.NONEXISTENT_FRAME.value, self)
@@ -180,53 +409,219 @@ class Prog:
 
 # Arguments
 class Arg:
+    __slots__ = ()
+
     def __init__(self):
         pass
 
 # Symbol (variable or constant)
 class Symb(Arg):
+    __slots__ = ('data',)
+
     def __init__(self, data):
         self.data = data
 
 # Variable, is in given frame, has name, and data
 class Var(Symb):
+    __slots__ = ('frame', 'name', 'slot')
+
     def __init__(self, frame, name, data):
         self.frame = frame
         self.name = name
+        self.slot = None        # Index in Prog.gf_slots (global variables in slot mode)
         self.data : Const = data
 
 # Constant, only has data
+# Values are never modified after creation, so the same object can be shared by many variables
 class Const(Symb):
+    __slots__ = ()
+
     def __init__(self, data):
         self.data = data
 
 # Constants of different types
 class Int(Const):
+    __slots__ = ()
+
     def __init__(self, data: int):
         self.data = data
 
+    # Integer value, small integers are shared instances
+    @staticmethod
+    def of(data: int):
+        if(-5 <= data <= 1024):
+            return SMALL_INTS[data + 5]
+        return Int(data)
+
 class String(Const):
+    __slots__ = ()
+    # Strings of this length and longer are kept in StringBuffer when changed by CONCAT or SETCHAR
+    BUFFER_LENGTH = 4096
+
     def __init__(self, data: str):
         self.data = data
 
+    # String with text of the second one appended
+    @staticmethod
+    def concat(string1, string2):
+        if(string1.__class__ is StringBuffer):
+            return string1.append(string2.data)
+        data = string1.data + string2.data
+        if(len(data) < String.BUFFER_LENGTH):
+            return String(data)
+        return StringBuffer(data)
+
+    # String with character on index replaced, the index is checked by the caller
+    @staticmethod
+    def setchar(string, index, char):
+        if(string.__class__ is StringBuffer):
+            return string.replace(index, char)
+        data = string.data
+        if(len(data) < String.BUFFER_LENGTH):
+            return String(data[0:index] + char + data[index+1:])
+        return StringBuffer(data[0:index] + char + data[index+1:])
+
+    # Length of string, the text of StringBuffer is not joined
+    @staticmethod
+    def length(string):
+        if(string.__class__ is StringBuffer):
+            return string._length
+        return len(string.data)
+
+    # Character on index, the index is checked by the caller
+    @staticmethod
+    def char(string, index):
+        if(string.__class__ is StringBuffer):
+            return string.char_at(index)
+        return string.data[index]
+
+# String as list of characters, appended and changed in place, built by CONCAT and SETCHAR from long strings
+# Only the newest value owns the list. The value it was made from records how it differs from the newer
+# one (its length before appending, or the replaced character), so all values keep their text, and the
+# text of an older value is rebuilt by undoing the changes. Text in data is joined on the first read.
+# A new value keeps its characters as str until it is changed (a list would not pay off for appended text
+# at least as long as the string). Older values are changed as str like String, so strings made from
+# the same older value do not copy its characters to a new list every time.
+class StringBuffer(String):
+    __slots__ = ('_chars', '_text', '_change', '_length')
+
+    def __init__(self, chars):
+        self._chars = chars         # Characters as str or list, None when a newer value owns them
+        self._text = None           # Joined text, None = not joined yet
+        self._change = None         # Newer value, index and replaced character (None = appended after index)
+        self._length = len(chars)
+
+    # Only data is missing (the slot is never set), it is the joined text
+    def __getattr__(self, name):
+        if(name != 'data'):
+            raise AttributeError(name)
+        if(self._text is None):
+            self._text = self._join()
+            self._change = None
+        return self._text
+
+    def append(self, text):
+        chars = self._chars
+        if(chars is None):
+            return StringBuffer(self.data + text)
+        if(chars.__class__ is str):
+            # Text at least as long as the string is appended as str, the list would not pay off
+            if(len(text) >= self._length):
+                return StringBuffer(chars + text)
+            self._text = chars
+            chars = list(chars)
+        length = self._length
+        chars.extend(text)
+        newer = StringBuffer(chars)
+        self._chars = None
+        if(self._text is None):
+            self._change = (newer, length, None)
+        return newer
+
+    def replace(self, index, char):
+        chars = self._chars
+        if(chars is None):
+            data = self.data
+            return StringBuffer(data[0:index] + char + data[index+1:])
+        if(chars.__class__ is str):
+            self._text = chars
+            chars = list(chars)
+        replaced = chars[index]
+        chars[index] = char
+        newer = StringBuffer(chars)
+        self._chars = None
+        if(self._text is None):
+            self._change = (newer, index, replaced)
+        return newer
+
+    def char_at(self, index):
+        if(self._chars is not None):
+            return self._chars[index]
+        return self.data[index]
+
+    def _join(self):
+        if(self._chars.__class__ is str):
+            return self._chars
+        if(self._chars is not None):
+            return ''.join(self._chars)
+        # Newer values up to the one with known characters, their changes are undone from the newest
+        changes = []
+        value = self
+        while(value._chars is None and value._text is None):
+            changes.append(value._change)
+            value = value._change[0]
+        chars = list(value._chars if value._chars is not None else value._text)
+        for _, index, char in reversed(changes):
+            if(char is None):
+                del chars[index:]
+            else:
+                chars[index] = char
+        return ''.join(chars)
+
 class Bool(Const):
+    __slots__ = ()
+
     def __init__(self, data: bool):
         self.data = data
 
+    # Shared instance of true or false
+    @staticmethod
+    def of(data):
+        return TRUE if data else FALSE
+
 class Nil(Const):
+    __slots__ = ()
+
     def __init__(self):
         self.data = 'nil'
 
 # Label is a special type, only has name
 class Label(Arg):
+    __slots__ = ('data',)
+
     def __init__(self, name):
         self.data = name
 
 # Type is a special type, only has type
 class Type(String):
+    __slots__ = ()
+
     def __init__(self, type):
         self.data = type
 
+    # Shared instance of type name
+    @staticmethod
+    def of(type):
+        return TYPES[type]
+
+# Shared instances of the most common values
+NIL = Nil()
+TRUE = Bool(True)
+FALSE = Bool(False)
+UNDEFINED = Const(None)     # Value of defined variable which was not initialized yet
+SMALL_INTS = [Int(i) for i in range(-5, 1025)]
+TYPES = {type: Type(type) for type in ['int', 'string', 'bool', 'nil', '']}
+
 # ------------------–------------------–------------------–------------------–------------------ #
 
 class Instruction:
@@ -234,6 +629,8 @@ class Instruction:
         self.opcode = opcode
         self.args = args
         self.program = program
+        self.target = None      # Instruction index of the label (jumps and calls)
+        self.order = None       # Order in the source (None for the implicit EXIT)
 
     def get_arg1(self):
         return self.args[0]
@@ -247,6 +644,19 @@ class Instruction:
     def execute(self, program: Prog):
         pass
 
+    # Turn instruction into a closure returning index of the next instruction (compiled engine),
+    # instructions without their own compile() are executed by the interpreter
+    def compile(self, compiler, index):
+        program = compiler.program
+        execute = self.execute
+
+        def op():
+            program.current_instruction = index
+            execute(program)
+            return program.current_instruction + 1
+        return op
+
+
 
 class MOVE(Instruction):
     def execute(self, program):
@@ -257,9 +667,31 @@ class MOVE(Instruction):
 
         program.write_to_var(var, val)
 
+    def compile(self, compiler, index):
+        write = compiler.writer(self.get_arg1(), index)
+        read = compiler.reader(self.get_arg2(), index)
+        following = index + 1
+
+        def op():
+            write(read())
+            return following
+        return op
+
+
 class CREATEFRAME(Instruction):
     def execute(self, program):
-        program.tf = {}
+        program.tf = program.new_frame()
+
+    def compile(self, compiler, index):
+        program = compiler.program
+        empty = program.new_frame()
+        following = index + 1
+
+        def op():
+            program.tf = empty.copy()
+            return following
+        return op
+
 
 class PUSHFRAME(Instruction):
     def execute(self, program):
@@ -269,6 +701,21 @@ class PUSHFRAME(Instruction):
         else:
             Helper.error_exit("Temporary frame is empty", Errors.NONEXISTENT_FRAME.value, program)
 
+    def compile(self, compiler, index):
+        program = compiler.program
+        error = compiler.error
+        lf = program.lf
+        following = index + 1
+
+        def op():
+            if(program.tf is not None):
+                lf.append(program.tf)
+                program.tf = None
+                return following
+            error(index, "Temporary frame is empty", Errors.NONEXISTENT_FRAME.value)
+        return op
+
+
 class POPFRAME(Instruction):
     def execute(self, program):
         if(len(program.lf) > 0):
@@ -276,21 +723,43 @@ class POPFRAME(Instruction):
         else:
             Helper.error_exit("Local frame is empty", Errors.NONEXISTENT_FRAME.value, program)
 
+    def compile(self, compiler, index):
+        program = compiler.program
+        error = compiler.error
+        lf = program.lf
+        following = index + 1
+
+        def op():
+            if(len(lf) > 0):
+                program.tf = lf.pop()
+                return following
+            error(index, "Local frame is empty", Errors.NONEXISTENT_FRAME.value)
+        return op
+
+
 class DEFVAR(Instruction):
     def execute(self, program):
         var = self.get_arg1()
         program.define_var(var)
 
+    def compile(self, compiler, index):
+        return compiler.definer(self.get_arg1(), index)
+
+
 class CALL(Instruction):
     def execute(self, program):
-        label = self.get_arg1()
+        program.callstack.append(program.current_instruction)
+        program.current_instruction = self.target
+
+    def compile(self, compiler, index):
+        callstack = compiler.program.callstack
+        target = self.target + 1
+
+        def op():
+            callstack.append(index)
+            return target
+        return op
 
-        index = program.find_label_index(label.data)
-        if(index != -1):
-            program.callstack.append(program.current_instruction)
-            program.current_instruction = index
-        else:
-            Helper.error_exit("Label not found", Errors.SEMANTIC_CHECKS.value, program)
 
 class RETURN(Instruction):
     def execute(self, program):
@@ -300,6 +769,17 @@ class RETURN(Instruction):
         else:
             Helper.error_exit("Empty callstack", Errors.MISSING_VALUE.value, program)
 
+    def compile(self, compiler, index):
+        callstack = compiler.program.callstack
+        error = compiler.error
+
+        def op():
+            if(len(callstack) > 0):
+                return callstack.pop() + 1
+            error(index, "Empty callstack", Errors.MISSING_VALUE.value)
+        return op
+
+
 class PUSHS(Instruction):
     def execute(self, program):
         symb1 = self.get_arg1()
@@ -308,6 +788,17 @@ class PUSHS(Instruction):
 
         program.stack.append(operand1)
 
+    def compile(self, compiler, index):
+        push = compiler.program.stack.append
+        read = compiler.reader(self.get_arg1(), index)
+        following = index + 1
+
+        def op():
+            push(read())
+            return following
+        return op
+
+
 
 class POPS(Instruction):
     def execute(self, program):
@@ -320,6 +811,20 @@ class POPS(Instruction):
 
         program.write_to_var(var, operand1)
 
+    def compile(self, compiler, index):
+        stack = compiler.program.stack
+        error = compiler.error
+        write = compiler.writer(self.get_arg1(), index)
+        following = index + 1
+
+        def op():
+            if(len(stack) > 0):
+                write(stack.pop())
+                return following
+            error(index, "Empty stack", Errors.MISSING_VALUE.value)
+        return op
+
+
 class ADD(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -333,10 +838,14 @@ class ADD(Instruction):
         val2 = operand2.data
 
         if(isinstance(operand1, Int) and isinstance(operand2, Int)):
-            program.write_to_var(var, Int(val1 + val2))
+            program.write_to_var(var, Int.of(val1 + val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        return compiler.arithmetic(self, index, operator.add)
+
+
 class SUB(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -350,10 +859,14 @@ class SUB(Instruction):
         val2 = operand2.data
 
         if(isinstance(operand1, Int) and isinstance(operand2, Int)):
-            program.write_to_var(var, Int(val1 - val2))
+            program.write_to_var(var, Int.of(val1 - val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        return compiler.arithmetic(self, index, operator.sub)
+
+
 class MUL(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -367,10 +880,14 @@ class MUL(Instruction):
         val2 = operand2.data
 
         if(isinstance(operand1, Int) and isinstance(operand2, Int)):
-            program.write_to_var(var, Int(val1 * val2))
+            program.write_to_var(var, Int.of(val1 * val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        return compiler.arithmetic(self, index, operator.mul)
+
+
 
 class IDIV(Instruction):
     def execute(self, program):
@@ -388,10 +905,28 @@ class IDIV(Instruction):
             Helper.error_exit("Division by zero", Errors.WRONG_OPERANT_VALUE.value, program)
 
         if(isinstance(operand1, Int) and isinstance(operand2, Int)):
-            program.write_to_var(var, Int(val1 // val2))
+            program.write_to_var(var, Int.of(val1 // val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write, read1, read2 = compiler.operands(self, index)
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            if(operand2.__class__ is Int):
+                if(operand2.data == 0):
+                    error(index, "Division by zero", Errors.WRONG_OPERANT_VALUE.value)
+                if(operand1.__class__ is Int):
+                    write(Int.of(operand1.data // operand2.data))
+                    return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 
 class LT(Instruction):
     def execute(self, program):
@@ -410,13 +945,17 @@ class LT(Instruction):
 
         if((isinstance(operand1, Int) and isinstance(operand2, Int)) or
            (isinstance(operand1, String) and isinstance(operand2, String))):
-            program.write_to_var(var, Bool(bool(val1 < val2)))
+            program.write_to_var(var, Bool.of(val1 < val2))
         elif(isinstance(operand1, Bool) and isinstance(operand2, Bool)):
             val1, val2 = int(val1), int(val2)
-            program.write_to_var(var, Bool(bool(val1 < val2)))
+            program.write_to_var(var, Bool.of(val1 < val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        return compiler.relational(self, index, operator.lt)
+
+
 class GT(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -434,13 +973,17 @@ class GT(Instruction):
 
         if((isinstance(operand1, Int) and isinstance(operand2, Int)) or
            (isinstance(operand1, String) and isinstance(operand2, String))):
-            program.write_to_var(var, Bool(bool(val1 > val2)))
+            program.write_to_var(var, Bool.of(val1 > val2))
         elif(isinstance(operand1, Bool) and isinstance(operand2, Bool)):
             val1, val2 = int(val1), int(val2)
-            program.write_to_var(var, Bool(bool(val1 > val2)))
+            program.write_to_var(var, Bool.of(val1 > val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        return compiler.relational(self, index, operator.gt)
+
+
 class EQ(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -455,18 +998,39 @@ class EQ(Instruction):
 
         if(isinstance(operand1, Nil) or isinstance(operand2, Nil)):
             if(isinstance(operand1, Nil) and isinstance(operand2, Nil)):
-                program.write_to_var(var, Bool(True))
+                program.write_to_var(var, TRUE)
             else:
-                program.write_to_var(var, Bool(False))
+                program.write_to_var(var, FALSE)
         elif((isinstance(operand1, Int) and isinstance(operand2, Int)) or
            (isinstance(operand1, String) and isinstance(operand2, String))):
-            program.write_to_var(var, Bool(bool(val1 == val2)))
+            program.write_to_var(var, Bool.of(val1 == val2))
         elif(isinstance(operand1, Bool) and isinstance(operand2, Bool)):
             val1, val2 = int(val1), int(val2)
-            program.write_to_var(var, Bool(bool(val1 == val2)))
+            program.write_to_var(var, Bool.of(val1 == val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write, read1, read2 = compiler.operands(self, index)
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            type1 = operand1.__class__
+            type2 = operand2.__class__
+            if(type1 is Nil or type2 is Nil):
+                write(TRUE if type1 is type2 else FALSE)
+                return following
+            if((type1 is Int and type2 is Int) or (type1 is Bool and type2 is Bool) or
+               (isinstance(operand1, String) and isinstance(operand2, String))):
+                write(TRUE if operand1.data == operand2.data else FALSE)
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 class AND(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -480,10 +1044,14 @@ class AND(Instruction):
         val2 = operand2.data
 
         if(isinstance(operand1, Bool) and isinstance(operand2, Bool)):
-            program.write_to_var(var, Bool(bool(val1 and val2)))
+            program.write_to_var(var, Bool.of(val1 and val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        return compiler.logical(self, index, lambda val1, val2: bool(val1 and val2))
+
+
 class OR(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -497,10 +1065,14 @@ class OR(Instruction):
         val2 = operand2.data
 
         if(isinstance(operand1, Bool) and isinstance(operand2, Bool)):
-            program.write_to_var(var, Bool(bool(val1 or val2)))
+            program.write_to_var(var, Bool.of(val1 or val2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        return compiler.logical(self, index, lambda val1, val2: bool(val1 or val2))
+
+
 class NOT(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -511,10 +1083,25 @@ class NOT(Instruction):
         val1 = operand1.data
 
         if(isinstance(operand1, Bool)):
-            program.write_to_var(var, Bool(bool(not val1)))
+            program.write_to_var(var, Bool.of(not val1))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write = compiler.writer(self.get_arg1(), index)
+        read = compiler.reader(self.get_arg2(), index)
+        following = index + 1
+
+        def op():
+            operand1 = read()
+            if(operand1.__class__ is Bool):
+                write(FALSE if operand1.data else TRUE)
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 class INT2CHAR(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -533,6 +1120,25 @@ class INT2CHAR(Instruction):
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write = compiler.writer(self.get_arg1(), index)
+        read = compiler.reader(self.get_arg2(), index)
+        following = index + 1
+
+        def op():
+            operand1 = read()
+            if(operand1.__class__ is Int):
+                try:
+                    char = chr(operand1.data)
+                except(ValueError):
+                    error(index, "Invalid ASCII code", Errors.WRONG_STRING.value)
+                write(String(char))
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 class STRI2INT(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -542,16 +1148,33 @@ class STRI2INT(Instruction):
         operand1 = program.get_symb(symb1)
         operand2 = program.get_symb(symb2)
 
-        val1 = operand1.data
         val2 = operand2.data
 
         if(isinstance(operand1, String) and isinstance(operand2, Int)):
-            if(val2 < 0 or val2 >= len(val1)):
+            if(val2 < 0 or val2 >= String.length(operand1)):
                 Helper.error_exit("Invalid index or character", Errors.WRONG_STRING.value, program)
-            program.write_to_var(var, Int(ord(val1[val2])))
+            program.write_to_var(var, Int.of(ord(String.char(operand1, val2))))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write, read1, read2 = compiler.operands(self, index)
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            if(isinstance(operand1, String) and operand2.__class__ is Int):
+                val2 = operand2.data
+                if(val2 < 0 or val2 >= String.length(operand1)):
+                    error(index, "Invalid index or character", Errors.WRONG_STRING.value)
+                write(Int.of(ord(String.char(operand1, val2))))
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 class READ(Instruction):
     def execute(self, program):
         var = self.get_arg1()
@@ -571,18 +1194,18 @@ class READ(Instruction):
 
         if (val_type.data == 'int'):
             try:
-                val = Int(int(read))
+                val = Int.of(int(read))
             except:
-                val = Nil()
+                val = NIL
             program.write_to_var(var, val)
         elif (val_type.data == 'bool'):
             read = read.lower().strip()
             if(read == 'true'):
-                val = Bool(bool(read))
+                val = Bool.of(read)
             elif(read == 'false'):
-                val = Bool(bool(read))
+                val = Bool.of(read)
             else:
-                val = Nil()
+                val = NIL
             program.write_to_var(var, val)
         elif (val_type.data == 'string'):
             string = read.strip()
@@ -592,6 +1215,37 @@ class READ(Instruction):
         else:
             Helper.error_exit("Wrong type", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    # Type given by a constant selects the conversion once, variable type is left to execute
+    def compile(self, compiler, index):
+        var_type = self.get_arg2()
+        if(not isinstance(var_type, Type) or var_type.data not in ['int', 'bool', 'string']):
+            return super().compile(compiler, index)
+
+        write = compiler.writer(self.get_arg1(), index)
+        readline = compiler.program.input.readline
+        following = index + 1
+
+        if(var_type.data == 'int'):
+            def op():
+                try:
+                    val = Int.of(int(readline()))
+                except(ValueError):
+                    val = NIL
+                write(val)
+                return following
+        elif(var_type.data == 'bool'):
+            def op():
+                read = readline().lower().strip()
+                write(Bool.of(read) if read == 'true' or read == 'false' else NIL)
+                return following
+        else:
+            string_escape = Helper.string_escape
+
+            def op():
+                write(String(str(string_escape(readline().strip()))))
+                return following
+        return op
+
 class WRITE(Instruction):
     def execute(self, program):
         symb1 = self.get_arg1()
@@ -608,7 +1262,25 @@ class WRITE(Instruction):
                     val1 = 'true'
                 elif(val1 == False):
                     val1 = 'false'
-            print(val1, end='')
+            program.output.write(str(val1))
+
+    def compile(self, compiler, index):
+        read = compiler.reader(self.get_arg1(), index)
+        output = compiler.program.output.write
+        following = index + 1
+
+        def op():
+            operand1 = read()
+            val1 = operand1.data
+            if not (val1 == None or val1 == "None" or val1 == ''):
+                if(operand1.__class__ is Nil):
+                    val1 = ''
+                elif(operand1.__class__ is Bool):
+                    val1 = 'true' if val1 else 'false'
+                output(str(val1))
+            return following
+        return op
+
 
 class CONCAT(Instruction):
     def execute(self, program):
@@ -619,14 +1291,26 @@ class CONCAT(Instruction):
         operand1 = program.get_symb(symb1)
         operand2 = program.get_symb(symb2)
 
-        val1 = operand1.data
-        val2 = operand2.data
-
         if(isinstance(operand1, String) and isinstance(operand2, String)):
-            program.write_to_var(var, String(str(val1 + val2)))
+            program.write_to_var(var, String.concat(operand1, operand2))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write, read1, read2 = compiler.operands(self, index)
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            if(isinstance(operand1, String) and isinstance(operand2, String)):
+                write(String.concat(operand1, operand2))
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 
 class STRLEN(Instruction):
     def execute(self, program):
@@ -635,13 +1319,26 @@ class STRLEN(Instruction):
 
         operand1 = program.get_symb(symb1)
 
-        val1 = operand1.data
-
         if(isinstance(operand1, String)):
-            program.write_to_var(var, Int(int(len(val1))))
+            program.write_to_var(var, Int.of(String.length(operand1)))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write = compiler.writer(self.get_arg1(), index)
+        read = compiler.reader(self.get_arg2(), index)
+        following = index + 1
+
+        def op():
+            operand1 = read()
+            if(isinstance(operand1, String)):
+                write(Int.of(String.length(operand1)))
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 
 class GETCHAR(Instruction):
     def execute(self, program):
@@ -652,16 +1349,33 @@ class GETCHAR(Instruction):
         operand1 = program.get_symb(symb1)
         operand2 = program.get_symb(symb2)
 
-        val1 = operand1.data
         val2 = operand2.data
 
         if(isinstance(operand1, String) and isinstance(operand2, Int)):
-            if(val2 < 0 or val2 >= len(val1)):
+            if(val2 < 0 or val2 >= String.length(operand1)):
                 Helper.error_exit("Wrong index", Errors.WRONG_STRING.value, program)
-            program.write_to_var(var, String(str(val1[val2:val2+1])))
+            program.write_to_var(var, String(String.char(operand1, val2)))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write, read1, read2 = compiler.operands(self, index)
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            if(isinstance(operand1, String) and operand2.__class__ is Int):
+                val2 = operand2.data
+                if(val2 < 0 or val2 >= String.length(operand1)):
+                    error(index, "Wrong index", Errors.WRONG_STRING.value)
+                write(String(String.char(operand1, val2)))
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 
 class SETCHAR(Instruction):
     def execute(self, program):
@@ -677,15 +1391,33 @@ class SETCHAR(Instruction):
         val1 = operand1.data
         val2 = operand2.data
 
-        string = program.read_var_obj(var).data
-
         if(isinstance(operand0, String) and isinstance(operand1, Int) and isinstance(operand2, String)):
-            if(val1 < 0 or val1 >= len(string)):
+            if(val1 < 0 or val1 >= String.length(operand0)):
                 Helper.error_exit("Wrong index", Errors.WRONG_STRING.value, program)
-            program.write_to_var(var, String(string[0:val1] + val2[0] + string[val1+1:]))
+            program.write_to_var(var, String.setchar(operand0, val1, val2[0]))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write, read1, read2 = compiler.operands(self, index)
+        read0 = compiler.reader(self.get_arg1(), index)
+        following = index + 1
+
+        def op():
+            operand0 = read0()
+            operand1 = read1()
+            operand2 = read2()
+            if(isinstance(operand0, String) and operand1.__class__ is Int and isinstance(operand2, String)):
+                val1 = operand1.data
+                if(val1 < 0 or val1 >= String.length(operand0)):
+                    error(index, "Wrong index", Errors.WRONG_STRING.value)
+                write(String.setchar(operand0, val1, operand2.data[0]))
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 
 class TYPE(Instruction):
     def execute(self, program: Prog):
@@ -695,37 +1427,74 @@ class TYPE(Instruction):
         operand1 = program.get_symb(symb1)
 
         if(isinstance(operand1, Int)):
-            program.write_to_var(var, Type('int'))
+            program.write_to_var(var, Type.of('int'))
         elif(isinstance(operand1, String)):
-            program.write_to_var(var, Type('string'))
+            program.write_to_var(var, Type.of('string'))
         elif(isinstance(operand1, Bool)):
-            program.write_to_var(var, Type('bool'))
+            program.write_to_var(var, Type.of('bool'))
         elif(isinstance(operand1, Nil)):
-            program.write_to_var(var, Type('nil'))
+            program.write_to_var(var, Type.of('nil'))
         elif(isinstance(operand1, Const)):
             if(operand1.data == None):
-                program.write_to_var(var, Type(""))
+                program.write_to_var(var, Type.of(""))
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        write = compiler.writer(self.get_arg1(), index)
+        read = compiler.reader(self.get_arg2(), index)
+        following = index + 1
+
+        def op():
+            operand1 = read()
+            if(operand1.__class__ is Int):
+                write(Type.of('int'))
+            elif(isinstance(operand1, String)):
+                write(Type.of('string'))
+            elif(operand1.__class__ is Bool):
+                write(Type.of('bool'))
+            elif(operand1.__class__ is Nil):
+                write(Type.of('nil'))
+            elif(isinstance(operand1, Const)):
+                if(operand1.data == None):
+                    write(Type.of(""))
+            else:
+                error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+            return following
+        return op
+
+
 
 class LABEL(Instruction):
     def execute(self, program):
         pass
 
+    def compile(self, compiler, index):
+        following = index + 1
+
+        def op():
+            return following
+        return op
+
+
 class JUMP(Instruction):
     def execute(self, program):
         label = self.get_arg1()
 
         if(isinstance(label, Label)):
-            index = program.find_label_index(label.data)
-            if(index != -1):
-                program.current_instruction = index
-            else:
-                Helper.error_exit("Wrong label", Errors.SEMANTIC_CHECKS.value, program)
+            program.current_instruction = self.target
         else:
             Helper.error_exit("Wrong argument", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        target = self.target + 1
+
+        def op():
+            return target
+        return op
+
+
 class JUMPIFEQ(Instruction):
     def execute(self, program):
         label = self.get_arg1()
@@ -740,26 +1509,42 @@ class JUMPIFEQ(Instruction):
 
         if(isinstance(operand1, Nil) or isinstance(operand2, Nil)):
             if(isinstance(operand1, Nil) and isinstance(operand2, Nil)):
-                index = program.find_label_index(label.data)
-                if(index != -1):
-                    program.current_instruction = index
-                else:
-                    Helper.error_exit("Wrong label", Errors.SEMANTIC_CHECKS.value, program)
+                program.current_instruction = self.target
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
         if(isinstance(label, Label)):
             if(issubclass(type(operand1), type(operand2)) or issubclass(type(operand2), type(operand1))):
                 if(val1 == val2):
-                    index = program.find_label_index(label.data)
-                    if(index != -1):
-                        program.current_instruction = index
-                    else:
-                        Helper.error_exit("Wrong label", Errors.SEMANTIC_CHECKS.value, program)
+                    program.current_instruction = self.target
             else:
                 Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        read1 = compiler.reader(self.get_arg2(), index)
+        read2 = compiler.reader(self.get_arg3(), index)
+        label = self.target
+        target = self.target + 1
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            type1 = operand1.__class__
+            type2 = operand2.__class__
+            if(type1 is Nil or type2 is Nil):
+                # Interpreter reports this error after jumping to the label
+                error(label if type1 is type2 else index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+            if(type1 is type2 or issubclass(type1, type2) or issubclass(type2, type1)):
+                if(operand1.data == operand2.data):
+                    return target
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 class JUMPIFNEQ(Instruction):
     def execute(self, program):
         label = self.get_arg1()
@@ -774,27 +1559,50 @@ class JUMPIFNEQ(Instruction):
 
         if(isinstance(operand1, Nil) or isinstance(operand2, Nil)):
             if(not(isinstance(operand1, Nil) and isinstance(operand2, Nil))):
-                index = program.find_label_index(label.data)
-                if(index != -1):
-                    program.current_instruction = index
-                else:
-                    Helper.error_exit("Wrong label", Errors.SEMANTIC_CHECKS.value, program)
+                program.current_instruction = self.target
             else:
                 Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+        # StringBuffer is compared as String, other classes must be the same (Type is not String)
+        type1 = String if type(operand1) is StringBuffer else type(operand1)
+        type2 = String if type(operand2) is StringBuffer else type(operand2)
         if(isinstance(label, Label)):
-            if(type(operand1) == type(operand2)):
+            if(type1 == type2):
                 if(val1 != val2):
-                    index = program.find_label_index(label.data)
-                    if(index != -1):
-                        program.current_instruction = index
-                    else:
-                        Helper.error_exit("Wrong label", Errors.SEMANTIC_CHECKS.value, program)
+                    program.current_instruction = self.target
             else:
                 Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        read1 = compiler.reader(self.get_arg2(), index)
+        read2 = compiler.reader(self.get_arg3(), index)
+        label = self.target
+        target = self.target + 1
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            type1 = operand1.__class__
+            type2 = operand2.__class__
+            if(type1 is Nil or type2 is Nil):
+                # Interpreter reports this error after jumping to the label
+                error(index if type1 is type2 else label, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+            if(type1 is not type2):
+                # StringBuffer is compared as String, other classes must be the same (Type is not String)
+                type1 = String if type1 is StringBuffer else type1
+                type2 = String if type2 is StringBuffer else type2
+            if(type1 is type2):
+                if(operand1.data != operand2.data):
+                    return target
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 class EXIT(Instruction):
     def execute(self, program: Prog):
         symb1 = self.get_arg1()
@@ -807,10 +1615,24 @@ class EXIT(Instruction):
             if(val1 < 0 or val1 > 49):
                 Helper.error_exit("Wrong exit code", Errors.WRONG_OPERANT_VALUE.value, program)
             else:
-                sys.exit(val1)
+                raise ProgramExit(val1)
         else:
             Helper.error_exit("Wrong operands", Errors.WRONG_OPERAND_TYPE.value, program)
 
+    def compile(self, compiler, index):
+        error = compiler.error
+        read = compiler.reader(self.get_arg1(), index)
+
+        def op():
+            operand1 = read()
+            if(operand1.__class__ is Int):
+                if(operand1.data < 0 or operand1.data > 49):
+                    error(index, "Wrong exit code", Errors.WRONG_OPERANT_VALUE.value)
+                raise ProgramExit(operand1.data)
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
 class DPRINT(Instruction):
     def execute(self, program):
         symb1 = self.get_arg1()
@@ -837,11 +1659,2464 @@ class BREAK(Instruction):
 
 # ------------------–------------------–------------------–------------------–------------------ #
 
+# Fused sequence of instructions (superinstruction) made by the peephole optimizer
+# It keeps opcode, arguments and order of the first instruction, so errors, statistics and the cache
+# see the original instruction, the other fused instructions stay in place after it
+class Superinstruction(Instruction):
+    def __init__(self, instructions):
+        first = instructions[0]
+        super().__init__(first.opcode, first.args, first.program)
+        self.target = first.target
+        self.order = first.order
+        self.fused = instructions
+
+
+# LT, GT or EQ into a variable followed by JUMPIFEQ or JUMPIFNEQ comparing it with bool constant
+class COMPAREJUMP(Superinstruction):
+    def __init__(self, instructions):
+        super().__init__(instructions)
+        jump = instructions[1]
+        constant = jump.get_arg3() if isinstance(jump.get_arg2(), Var) else jump.get_arg2()
+        # Result of the comparison which makes the jump
+        self.jump_if = constant.data if jump.opcode == 'JUMPIFEQ' else not constant.data
+
+    def execute(self, program):
+        compare, jump = self.fused
+        compare.execute(program)
+
+        # Variable holds bool now, so the jump cannot fail
+        program.current_instruction += 1
+        if(program.get_symb(compare.get_arg1()).data == self.jump_if):
+            program.current_instruction = jump.target
+
+    def compile(self, compiler, index):
+        compare = compiler.comparison(self.fused[0], index)
+        write = compiler.writer(self.get_arg1(), index)
+        jump_if = TRUE if self.jump_if else FALSE
+        target = self.fused[1].target + 1
+        following = index + 2
+
+        def op():
+            result = compare()
+            write(result)
+            if(result is jump_if):
+                return target
+            return following
+        return op
+
+
+# ADD or SUB of integer constant to the same variable (loop counters)
+class INCREMENT(Superinstruction):
+    def __init__(self, instructions):
+        super().__init__(instructions)
+        instruction = instructions[0]
+        self.var = instruction.get_arg1()
+        constant = instruction.get_arg3() if isinstance(instruction.get_arg2(), Var) else instruction.get_arg2()
+        self.step = constant.data if instruction.opcode == 'ADD' else -constant.data
+
+    def execute(self, program):
+        operand = program.get_symb(self.var)
+        if(operand.__class__ is Int):
+            program.write_to_var(self.var, Int.of(operand.data + self.step))
+        else:
+            # Original instruction reports the error
+            self.fused[0].execute(program)
+
+    def compile(self, compiler, index):
+        read = compiler.reader(self.var, index)
+        write = compiler.writer(self.var, index)
+        original = self.fused[0]
+        step = self.step
+        following = index + 1
+
+        def op():
+            operand = read()
+            if(operand.__class__ is Int):
+                write(Int.of(operand.data + step))
+                return following
+            return original.compile(compiler, index)()
+        return op
+
+
+# PUSHS followed by POPS, the value does not go through the data stack
+class PUSHPOP(Superinstruction):
+    def execute(self, program):
+        push, pop = self.fused
+        value = program.get_symb(push.get_arg1())
+        program.current_instruction += 1
+        program.write_to_var(pop.get_arg1(), value)
+
+    def compile(self, compiler, index):
+        read = compiler.reader(self.fused[0].get_arg1(), index)
+        write = compiler.writer(self.fused[1].get_arg1(), index + 1)
+        following = index + 2
+
+        def op():
+            write(read())
+            return following
+        return op
+
+
+# Chain of MOVE instructions
+class MOVES(Superinstruction):
+    def execute(self, program):
+        index = program.current_instruction
+        for i in range(len(self.fused)):
+            program.current_instruction = index + i
+            self.fused[i].execute(program)
+
+    def compile(self, compiler, index):
+        moves = [(compiler.writer(self.fused[i].get_arg1(), index + i), compiler.reader(self.fused[i].get_arg2(), index + i))
+                 for i in range(len(self.fused))]
+        following = index + len(self.fused)
+
+        def op():
+            for write, read in moves:
+                write(read())
+            return following
+        return op
+
+
+# CREATEFRAME followed by DEFVAR of temporary frame variables (frame made for a call), or PUSHFRAME followed
+# by DEFVAR of local frame variables (start of a function). The variables are defined all at once, a new
+# frame is a copy of the prepared one, which is cheaper than reusing frames from a pool (they would have to
+# be cleared and filled again).
+class FRAME(Superinstruction):
+    def __init__(self, instructions, frame):
+        super().__init__(instructions)
+        # Keys of the variables in the frame, names or slots (frames as lists)
+        self.keys = [var.name if var.slot is None else var.slot for var in [i.get_arg1() for i in instructions[1:]]]
+        self.layout = frame     # Empty frame of the program with the variables defined
+        for key in self.keys:
+            self.layout[key] = UNDEFINED
+
+    def execute(self, program):
+        if(self.opcode == 'CREATEFRAME'):
+            program.tf = self.layout.copy()
+        elif(program.tf is not None and not self._defines_any(program.tf)):
+            for key in self.keys:
+                program.tf[key] = UNDEFINED
+            program.lf.append(program.tf)
+            program.tf = None
+        else:
+            # PUSHFRAME reports the error, or the DEFVAR instructions run one by one
+            self.fused[0].execute(program)
+            return
+        program.current_instruction += len(self.fused) - 1
+
+    # Some of the variables is already in the frame
+    def _defines_any(self, frame):
+        if(isinstance(frame, dict)):
+            return not frame.keys().isdisjoint(self.keys)
+        return any(map(frame.__getitem__, self.keys))
+
+    def compile(self, compiler, index):
+        program = compiler.program
+        layout = self.layout
+        following = index + len(self.fused)
+
+        if(self.opcode == 'CREATEFRAME'):
+            def op():
+                program.tf = layout.copy()
+                return following
+            return op
+
+        lf = program.lf
+        keys = self.keys
+        original = self.fused[0].compile(compiler, index)
+
+        if(isinstance(layout, dict)):
+            def op():
+                tf = program.tf
+                if(tf is not None and tf.keys().isdisjoint(layout)):
+                    tf.update(layout)
+                    lf.append(tf)
+                    program.tf = None
+                    return following
+                return original()
+        else:
+            def op():
+                tf = program.tf
+                if(tf is not None and not any(map(tf.__getitem__, keys))):
+                    for key in keys:
+                        tf[key] = UNDEFINED
+                    lf.append(tf)
+                    program.tf = None
+                    return following
+                return original()
+        return op
+
+
+# CALL followed by RETURN (call in tail position). When the callstack holds the return address of the
+# caller, the callee returns there directly, so the call does not push anything. Frames are not touched,
+# PUSHFRAME and POPFRAME of the callee run as they are.
+class TAILCALL(Superinstruction):
+    def execute(self, program):
+        if(len(program.callstack) > 0):
+            program.current_instruction = self.target
+        else:
+            # RETURN after the call would end with error, the call runs as it is
+            self.fused[0].execute(program)
+
+    def compile(self, compiler, index):
+        callstack = compiler.program.callstack
+        target = self.target + 1
+        original = self.fused[0].compile(compiler, index)
+
+        def op():
+            if(callstack):
+                return target
+            return original()
+        return op
+
+
+# CALL of pure function (--memoize), its result is taken from Prog.memo when the function already ran
+# with the same arguments. Otherwise the call runs and MEMORETURN of the function stores the result.
+# Summary of the function is given by Purity: consumed stack values and whether the temporary frame
+# is its argument and its result.
+class MEMOCALL(Superinstruction):
+    def __init__(self, instructions, consumed, reads, writes):
+        super().__init__(instructions)
+        self.consumed = consumed    # Values taken from the data stack by the function
+        self.reads = reads          # Temporary frame is argument of the function
+        self.writes = writes        # Temporary frame is result of the function
+
+    def execute(self, program):
+        memo = program.memo
+        key = memo.key(program, self.target, self.consumed, self.reads)
+        if(key is not None):
+            result = memo.lookup(key)
+            if(result is not None):
+                memo.apply(program, result, self.consumed, self.writes)
+                return
+            memo.enter(key, len(program.callstack) + 1, len(program.stack) - self.consumed, self.writes)
+        self.fused[0].execute(program)
+
+    def compile(self, compiler, index):
+        program = compiler.program
+        memo = program.memo
+        callstack = program.callstack
+        stack = program.stack
+        start = self.target
+        target = self.target + 1
+        following = index + 1
+        consumed = self.consumed
+        reads = self.reads
+        writes = self.writes
+
+        def op():
+            key = memo.key(program, start, consumed, reads)
+            if(key is not None):
+                result = memo.lookup(key)
+                if(result is not None):
+                    memo.apply(program, result, consumed, writes)
+                    return following
+                memo.enter(key, len(callstack) + 1, len(stack) - consumed, writes)
+            callstack.append(index)
+            return target
+        return op
+
+
+# RETURN in body of pure function, stores the result of the memoized call it returns from
+class MEMORETURN(Superinstruction):
+    def execute(self, program):
+        program.memo.leave(program)
+        self.fused[0].execute(program)
+
+    def compile(self, compiler, index):
+        program = compiler.program
+        leave = program.memo.leave
+        original = self.fused[0].compile(compiler, index)
+
+        def op():
+            leave(program)
+            return original()
+        return op
+
+
+# Instruction with constant operands evaluated while loading, writes the result and continues
+# at the index where the instruction would continue (a conditional jump becomes unconditional or nothing)
+class FOLDED(Superinstruction):
+    def __init__(self, instructions, value, following):
+        super().__init__(instructions)
+        self.value = value          # Result written to the variable, None for jumps
+        self.following = following  # Index of the next instruction
+
+    def execute(self, program):
+        if(self.value is not None):
+            program.write_to_var(self.get_arg1(), self.value)
+        program.current_instruction = self.following - 1
+
+    def compile(self, compiler, index):
+        following = self.following
+        if(self.value is None):
+            def op():
+                return following
+            return op
+
+        write = compiler.writer(self.get_arg1(), index)
+        value = self.value
+
+        def op():
+            write(value)
+            return following
+        return op
+
+
+# Instruction which can never run, it is not compiled at all
+class UNREACHABLE(Superinstruction):
+    def execute(self, program):
+        self.fused[0].execute(program)
+
+    def compile(self, compiler, index):
+        return None
+
+
+# Instruction with operand types proven by type inference, it runs without any type checks
+# Operands are constants or defined global variables, the operation gets their data and returns
+# the result (condition for jumps), None when the instruction ends with error, which is then
+# reported by the original instruction. Operands without the proven types (which would be a mistake of
+# the inference) make the operation raise TypeError or AttributeError, the original instruction then
+# runs and reports the error instead of crashing the interpreter
+class TYPED(Superinstruction):
+    def __init__(self, instructions, operation):
+        super().__init__(instructions)
+        self.operation = operation
+        self.jump = self.opcode in ['JUMPIFEQ', 'JUMPIFNEQ']
+        # Global frame key (name, or slot in slot mode) of every variable argument, None for constants
+        self.keys = [None if not isinstance(arg, Var) else arg.name if arg.slot is None else arg.slot for arg in self.args]
+        self.data = [None if isinstance(arg, Var) else arg.data for arg in self.args]
+
+    def execute(self, program):
+        frame = program.gf if program.gf_slots is None else program.gf_slots
+        keys = self.keys
+        try:
+            value1 = self.data[1] if keys[1] is None else frame[keys[1]].data
+            if(len(keys) == 2):
+                result = self.operation(value1)
+            else:
+                value2 = self.data[2] if keys[2] is None else frame[keys[2]].data
+                result = self.operation(value1, value2)
+        except(TypeError, AttributeError):
+            self.fused[0].execute(program)
+            return
+
+        if(self.jump):
+            if(result):
+                program.current_instruction = self.target
+        elif(result is not None):
+            frame[keys[0]] = result
+        else:
+            self.fused[0].execute(program)
+
+    def compile(self, compiler, index):
+        program = compiler.program
+        frame = program.gf if program.gf_slots is None else program.gf_slots
+        operation = self.operation
+        key, key1 = self.keys[0], self.keys[1]
+        data1 = self.data[1]
+        original = self.fused[0]
+        following = index + 1
+
+        if(self.jump):
+            key2, data2 = self.keys[2], self.data[2]
+            target = self.target + 1
+            if(key1 is not None and key2 is not None):
+                def op():
+                    try:
+                        return target if operation(frame[key1].data, frame[key2].data) else following
+                    except(TypeError, AttributeError):
+                        return original.compile(compiler, index)()
+            elif(key1 is not None):
+                def op():
+                    try:
+                        return target if operation(frame[key1].data, data2) else following
+                    except(TypeError, AttributeError):
+                        return original.compile(compiler, index)()
+            else:
+                def op():
+                    try:
+                        return target if operation(data1, frame[key2].data) else following
+                    except(TypeError, AttributeError):
+                        return original.compile(compiler, index)()
+            return op
+
+        if(len(self.keys) == 2):
+            def op():
+                try:
+                    result = operation(frame[key1].data)
+                except(TypeError, AttributeError):
+                    return original.compile(compiler, index)()
+                frame[key] = result
+                return following
+            return op
+
+        key2, data2 = self.keys[2], self.data[2]
+        if(key1 is not None and key2 is not None):
+            def op():
+                try:
+                    result = operation(frame[key1].data, frame[key2].data)
+                except(TypeError, AttributeError):
+                    result = None
+                if(result is None):
+                    return original.compile(compiler, index)()
+                frame[key] = result
+                return following
+        elif(key1 is not None):
+            def op():
+                try:
+                    result = operation(frame[key1].data, data2)
+                except(TypeError, AttributeError):
+                    result = None
+                if(result is None):
+                    return original.compile(compiler, index)()
+                frame[key] = result
+                return following
+        else:
+            def op():
+                try:
+                    result = operation(data1, frame[key2].data)
+                except(TypeError, AttributeError):
+                    result = None
+                if(result is None):
+                    return original.compile(compiler, index)()
+                frame[key] = result
+                return following
+        return op
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Dataflow type inference of global variables over the control flow graph of the program
+# Types of local and temporary frame variables are not tracked (frames change with calls)
+class TypeInference:
+    # Possible types of variable, bit flags
+    MISSING = 1         # Variable is not defined
+    UNDEFINED = 2       # Variable is defined, but has no value
+    INT = 4
+    BOOL = 8
+    STRING = 16
+    NIL = 32
+    TYPE = 64
+    ANY = 127
+
+    _classes = {Int: INT, Bool: BOOL, String: STRING, Nil: NIL, Type: TYPE}
+
+    # Types of the result and types of operands after the instruction succeeds (None = not changed)
+    _results = {
+        'ADD': (INT, INT, INT), 'SUB': (INT, INT, INT), 'MUL': (INT, INT, INT), 'IDIV': (INT, INT, INT),
+        'LT': (BOOL, None, None), 'GT': (BOOL, None, None), 'EQ': (BOOL, None, None),
+        'AND': (BOOL, BOOL, BOOL), 'OR': (BOOL, BOOL, BOOL), 'NOT': (BOOL, BOOL),
+        'INT2CHAR': (STRING, INT), 'STRI2INT': (INT, STRING | TYPE, INT),
+        'CONCAT': (STRING, STRING | TYPE, STRING | TYPE), 'STRLEN': (INT, STRING | TYPE),
+        'GETCHAR': (STRING, STRING | TYPE, INT), 'SETCHAR': (STRING, STRING | TYPE, INT, STRING | TYPE),
+        'TYPE': (TYPE, None),
+    }
+
+    def __init__(self, instructions):
+        self.instructions = instructions
+        self.variables = {}     # Name of global variable -> index in the state
+        for instruction in instructions:
+            for arg in instruction.args:
+                if(isinstance(arg, Var) and arg.frame == 'GF'):
+                    self.variables.setdefault(arg.name, len(self.variables))
+        self.returns = [i + 1 for i in range(len(instructions)) if instructions[i].opcode == 'CALL']
+
+    # Generates index of every reachable instruction and the types before it
+    def run(self):
+        instructions = self.instructions
+        leaders = sorted(self._leaders())
+        ends = dict(zip(leaders, leaders[1:] + [len(instructions)]))
+
+        # Types at the start of every basic block, joined over all its predecessors
+        states = {0: [self.MISSING] * len(self.variables)}
+        pending = [0]
+        while(len(pending) > 0):
+            start = pending.pop()
+            state = list(states[start])
+            for i in range(start, ends[start]):
+                self._transfer(instructions[i], state)
+
+            for successor in self._successors(ends[start] - 1):
+                if(successor >= len(instructions)):
+                    continue
+                old = states.get(successor)
+                if(old is None):
+                    states[successor] = list(state)
+                    pending.append(successor)
+                    continue
+                joined = [old[j] | state[j] for j in range(len(state))]
+                if(joined != old):
+                    states[successor] = joined
+                    pending.append(successor)
+
+        for start in sorted(states):
+            state = list(states[start])
+            for i in range(start, ends[start]):
+                yield i, state
+                self._transfer(instructions[i], state)
+
+    # Type of variable or constant, single flag when it is known
+    def types(self, symb, state):
+        if(isinstance(symb, Var)):
+            if(symb.frame != 'GF'):
+                return self.ANY
+            return state[self.variables[symb.name]]
+        return self._classes.get(type(symb), self.ANY)
+
+    # First instructions of basic blocks
+    def _leaders(self):
+        leaders = {0}
+        for i in range(len(self.instructions)):
+            instruction = self.instructions[i]
+            if(instruction.opcode == 'LABEL'):
+                leaders.add(i)
+            if(instruction.opcode in ['JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'CALL', 'RETURN', 'EXIT'] or
+               isinstance(instruction, UNREACHABLE)):
+                leaders.add(i + 1)
+            # Folded jump continues after the label (the label itself can be unreachable)
+            if(isinstance(instruction, FOLDED)):
+                leaders.add(instruction.following)
+        leaders.discard(len(self.instructions))
+        return leaders
+
+    # Blocks where the program continues after the instruction
+    def _successors(self, i):
+        instruction = self.instructions[i]
+        opcode = instruction.opcode
+        if(isinstance(instruction, UNREACHABLE) or opcode == 'EXIT'):
+            return []
+        if(isinstance(instruction, FOLDED)):
+            return [instruction.following]
+        if(opcode == 'JUMP' or opcode == 'CALL'):
+            return [instruction.target]
+        if(opcode in ['JUMPIFEQ', 'JUMPIFNEQ']):
+            return [instruction.target, i + 1]
+        if(opcode == 'RETURN'):
+            return self.returns
+        return [i + 1]
+
+    # Change the types by the instruction, as it is when the instruction succeeds
+    def _transfer(self, instruction, state):
+        opcode = instruction.opcode
+        args = instruction.args
+        if(opcode == 'DEFVAR'):
+            self._set(args[0], state, self.UNDEFINED)
+        elif(opcode == 'MOVE'):
+            self._set(args[0], state, self.types(args[1], state) & ~self.MISSING)
+        elif(opcode in ['POPS', 'READ']):
+            self._set(args[0], state, self.ANY & ~self.MISSING)
+        elif(opcode in self._results):
+            result = self._results[opcode]
+            # SETCHAR also reads its variable, which has to be a string
+            operands = args if opcode == 'SETCHAR' else args[1:]
+            for j in range(len(operands)):
+                if(j + 1 < len(result) and result[j + 1] is not None):
+                    self._refine(operands[j], state, result[j + 1])
+            self._set(args[0], state, result[0])
+
+    def _set(self, var, state, types):
+        if(var.frame == 'GF'):
+            state[self.variables[var.name]] = types
+
+    # Operand of successful instruction has one of the given types
+    def _refine(self, symb, state, types):
+        if(isinstance(symb, Var) and symb.frame == 'GF'):
+            state[self.variables[symb.name]] &= types
+
+
+# Optimizer of the loaded program: constant folding, dead code elimination, type specialization
+# and peephole optimization, which replaces common instruction sequences by superinstructions
+# Replaced instructions stay in the program (fused instructions other than the first too), so
+# instruction indexes, jump targets and error positions do not change
+class Optimizer:
+    # Comparisons which can be fused with the following conditional jump
+    _comparisons = ['LT', 'GT', 'EQ']
+    # First instructions of all fused sequences
+    _candidates = {'LT', 'GT', 'EQ', 'ADD', 'SUB', 'PUSHS', 'MOVE', 'CREATEFRAME', 'PUSHFRAME'}
+
+    # Instructions which can be evaluated while loading when their operands are constants
+    _foldable = ['ADD', 'SUB', 'MUL', 'IDIV', 'LT', 'GT', 'EQ', 'AND', 'OR', 'NOT', 'INT2CHAR', 'STRI2INT',
+                 'CONCAT', 'STRLEN', 'GETCHAR', 'TYPE', 'JUMPIFEQ', 'JUMPIFNEQ']
+
+    def __init__(self, program: Prog):
+        self.program = program
+
+    # Operations of instructions with proven operand types, for TYPED
+    # (not CONCAT, STRLEN, GETCHAR and STRI2INT, which would join the text of StringBuffer operands)
+    _typed = {
+        'ADD': lambda a, b: Int.of(a + b),
+        'SUB': lambda a, b: Int.of(a - b),
+        'MUL': lambda a, b: Int.of(a * b),
+        'IDIV': lambda a, b: Int.of(a // b) if b != 0 else None,
+        'LT': lambda a, b: TRUE if a < b else FALSE,
+        'GT': lambda a, b: TRUE if a > b else FALSE,
+        'EQ': lambda a, b: TRUE if a == b else FALSE,
+        'AND': lambda a, b: TRUE if a and b else FALSE,
+        'OR': lambda a, b: TRUE if a or b else FALSE,
+        'NOT': lambda a: FALSE if a else TRUE,
+        'JUMPIFEQ': operator.eq,
+        'JUMPIFNEQ': operator.ne,
+    }
+    # Operand types of the operations, None = both operands have the same type (int, bool or string)
+    _typed_operands = {
+        'ADD': (TypeInference.INT, TypeInference.INT), 'SUB': (TypeInference.INT, TypeInference.INT),
+        'MUL': (TypeInference.INT, TypeInference.INT), 'IDIV': (TypeInference.INT, TypeInference.INT),
+        'LT': None, 'GT': None, 'EQ': None, 'JUMPIFEQ': None, 'JUMPIFNEQ': None,
+        'AND': (TypeInference.BOOL, TypeInference.BOOL), 'OR': (TypeInference.BOOL, TypeInference.BOOL),
+        'NOT': (TypeInference.BOOL,),
+    }
+
+    def optimize(self, instructions):
+        self.fold_constants(instructions)
+        self.eliminate_dead_code(instructions)
+        self.eliminate_tail_calls(instructions)
+
+        # Specialized instructions and superinstructions only pay off when they run repeatedly
+        repeated = self._repeated(instructions)
+        if(any(repeated)):
+            self.specialize_types(instructions, repeated)
+            self.fuse(instructions, repeated)
+        return instructions
+
+    # Instructions which can run more than once: every cycle of the control flow graph goes back over
+    # each of its instructions, so they are covered by a backward jump, call or return
+    @staticmethod
+    def _repeated(instructions):
+        returns = [i + 1 for i in range(len(instructions)) if instructions[i].opcode == 'CALL']
+        covered = [0] * (len(instructions) + 1)
+        for i in range(len(instructions)):
+            instruction = instructions[i]
+            if(instruction.opcode in Helper.Branches and instruction.target <= i):
+                covered[instruction.target] += 1
+                covered[i + 1] -= 1
+            elif(instruction.opcode == 'RETURN'):
+                for site in returns:
+                    if(site <= i):
+                        covered[site] += 1
+                        covered[i + 1] -= 1
+
+        repeated = []
+        depth = 0
+        for i in range(len(instructions)):
+            depth += covered[i]
+            repeated.append(depth > 0)
+        return repeated
+
+    # Replace instructions with operand types proven by type inference by their unchecked variants
+    def specialize_types(self, instructions, repeated):
+        inference = TypeInference(instructions)
+        comparable = [TypeInference.INT, TypeInference.BOOL, TypeInference.STRING]
+        specialized = []
+        for i, state in inference.run():
+            instruction = instructions[i]
+            if(not repeated[i] or instruction.opcode not in self._typed or isinstance(instruction, Superinstruction)):
+                continue
+
+            jump = instruction.opcode in ['JUMPIFEQ', 'JUMPIFNEQ']
+            var = instruction.get_arg1()
+            if(not jump and (var.frame != 'GF' or inference.types(var, state) & TypeInference.MISSING)):
+                continue
+            operands = instruction.args[1:]
+            # Constant operands only remain when the instruction ends with error
+            if(all(not isinstance(operand, Var) for operand in operands) or
+               any(isinstance(operand, Var) and operand.frame != 'GF' for operand in operands)):
+                continue
+
+            types = tuple(inference.types(operand, state) for operand in operands)
+            expected = self._typed_operands[instruction.opcode]
+            if(expected is None):
+                expected = (types[0], types[0]) if types[0] in comparable else None
+            if(types == expected):
+                specialized.append((i, TYPED([instruction], self._typed[instruction.opcode])))
+
+        for i, instruction in specialized:
+            instructions[i] = instruction
+
+    # Replace instructions with constant operands by their result, instructions which would end
+    # with an error are kept, so the error is reported when (and if) they run
+    def fold_constants(self, instructions):
+        folder = Folder(self.program)
+        for i in range(len(instructions)):
+            instruction = instructions[i]
+            if(instruction.opcode not in self._foldable or isinstance(instruction, Superinstruction)):
+                continue
+            operands = instruction.args[1:]
+            if(any(isinstance(operand, Var) for operand in operands)):
+                continue
+
+            result = folder.fold(instruction, i)
+            if(result is not None):
+                instructions[i] = FOLDED([instruction], *result)
+
+    # Replace instructions which cannot be reached from the start of the program
+    def eliminate_dead_code(self, instructions):
+        reachable = [False] * len(instructions)
+        pending = [0]
+        while(len(pending) > 0):
+            i = pending.pop()
+            if(i >= len(instructions) or reachable[i]):
+                continue
+            reachable[i] = True
+            pending.extend(self._successors(instructions[i], i))
+
+        for i in range(len(instructions)):
+            if(not reachable[i] and not isinstance(instructions[i], UNREACHABLE)):
+                instructions[i] = UNREACHABLE([instructions[i]])
+
+    # Replace CALL followed by RETURN by TAILCALL, also in code which runs once (it saves memory, not time)
+    @staticmethod
+    def eliminate_tail_calls(instructions):
+        for i in range(len(instructions) - 1):
+            call, following = instructions[i], instructions[i + 1]
+            if(call.opcode == 'CALL' and following.opcode == 'RETURN' and
+               not isinstance(call, Superinstruction) and not isinstance(following, Superinstruction)):
+                instructions[i] = TAILCALL([call, following])
+
+    # Indexes where the program can continue after the instruction (errors end the program)
+    @staticmethod
+    def _successors(instruction, i):
+        if(isinstance(instruction, FOLDED)):
+            return [instruction.following]
+        opcode = instruction.opcode
+        if(opcode in ['EXIT', 'RETURN']):
+            # RETURN continues after CALL, which is a successor of the CALL
+            return []
+        if(opcode == 'JUMP'):
+            return [instruction.target]
+        if(opcode in ['JUMPIFEQ', 'JUMPIFNEQ', 'CALL']):
+            return [instruction.target, i + 1]
+        return [i + 1]
+
+    # Replace common instruction sequences by superinstructions
+    def fuse(self, instructions, repeated):
+        i = 0
+        while(i < len(instructions)):
+            superinstruction = self._fuse(instructions, i) if repeated[i] else None
+            if(superinstruction is None):
+                i += 1
+            else:
+                instructions[i] = superinstruction
+                i += len(superinstruction.fused)
+
+    # Superinstruction starting at the index, None when there is none
+    def _fuse(self, instructions, i):
+        first = instructions[i]
+        if(first.opcode not in self._candidates or isinstance(first, Superinstruction)):
+            return None
+        second = instructions[i + 1] if i + 1 < len(instructions) else None
+        if(isinstance(second, Superinstruction)):
+            second = None
+
+        if(first.opcode in self._comparisons and second is not None and self._is_bool_jump(second, first.get_arg1())):
+            return COMPAREJUMP([first, second])
+        if(first.opcode in ['ADD', 'SUB'] and self._is_increment(first)):
+            return INCREMENT([first])
+        if(first.opcode == 'PUSHS' and second is not None and second.opcode == 'POPS'):
+            return PUSHPOP([first, second])
+        if(first.opcode == 'MOVE'):
+            end = i + 1
+            while(end < len(instructions) and instructions[end].opcode == 'MOVE'):
+                end += 1
+            if(end - i > 1):
+                return MOVES(instructions[i:end])
+        if(first.opcode in ['CREATEFRAME', 'PUSHFRAME']):
+            end = self._frame_end(instructions, i, 'TF' if first.opcode == 'CREATEFRAME' else 'LF')
+            if(end - i > 1):
+                return FRAME(instructions[i:end], self.program.new_frame())
+        return None
+
+    # End of DEFVAR instructions defining different variables of the frame after the index
+    @staticmethod
+    def _frame_end(instructions, i, frame):
+        names = set()
+        end = i + 1
+        while(end < len(instructions) and instructions[end].opcode == 'DEFVAR' and
+              not isinstance(instructions[end], Superinstruction)):
+            var = instructions[end].get_arg1()
+            if(var.frame != frame or var.name in names):
+                break
+            names.add(var.name)
+            end += 1
+        return end
+
+    # JUMPIFEQ or JUMPIFNEQ comparing the variable with bool constant
+    @staticmethod
+    def _is_bool_jump(instruction, var):
+        if(instruction.opcode not in ['JUMPIFEQ', 'JUMPIFNEQ']):
+            return False
+        symb1 = instruction.get_arg2()
+        symb2 = instruction.get_arg3()
+        if(isinstance(symb2, Var)):
+            symb1, symb2 = symb2, symb1
+        return Optimizer._same_var(symb1, var) and isinstance(symb2, Bool)
+
+    # ADD var var int or ADD var int var or SUB var var int
+    @staticmethod
+    def _is_increment(instruction):
+        var = instruction.get_arg1()
+        symb1 = instruction.get_arg2()
+        symb2 = instruction.get_arg3()
+        if(instruction.opcode == 'ADD' and isinstance(symb1, Int)):
+            symb1, symb2 = symb2, symb1
+        return Optimizer._same_var(symb1, var) and isinstance(symb2, Int)
+
+    @staticmethod
+    def _same_var(symb, var):
+        return isinstance(symb, Var) and isinstance(var, Var) and symb.frame == var.frame and symb.name == var.name
+
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Analysis of functions (code from CALL target to RETURN) for memoization of their results (--memoize)
+# Function is pure when it reads only its arguments (values on the data stack and the temporary frame),
+# has no input, output or exit, does not use the global frame and frames of its caller and calls only
+# pure functions. Its summary is (consumed, change, reads, writes, returned): values it takes from
+# the stack, change of stack length, whether the temporary frame is its argument and whether it is its
+# result, and which frame is the temporary one after return ('entry' = the frame of the caller, 'new'
+# or 'none').
+class Purity:
+    IMPURE = 'impure'
+    MAX_CONSUMED = 16       # Functions taking more stack values are not memoized
+    _impure = ['READ', 'WRITE', 'DPRINT', 'BREAK', 'EXIT']
+
+    def __init__(self, instructions):
+        self.instructions = instructions
+        self.functions = sorted({instruction.target for instruction in map(self._original, instructions)
+                                 if instruction.opcode == 'CALL'})
+        self.summaries = {}     # Function target -> summary, None = never returns, IMPURE = not pure
+        self.bodies = {}        # Function target -> indexes of its instructions
+
+    # Replace calls of pure functions by MEMOCALL and returns in their bodies by MEMORETURN
+    def mark(self):
+        summaries = self.run()
+        instructions = self.instructions
+        for i in range(len(instructions)):
+            instruction = instructions[i]
+            if(instruction.opcode == 'CALL' and not isinstance(instruction, Superinstruction) and
+               instruction.target in summaries):
+                consumed, _, reads, writes, _ = summaries[instruction.target]
+                instructions[i] = MEMOCALL([instruction], consumed, reads, writes)
+
+        for target in summaries:
+            for i in self.bodies[target]:
+                instruction = instructions[i]
+                if(instruction.opcode == 'RETURN' and not isinstance(instruction, Superinstruction)):
+                    instructions[i] = MEMORETURN([instruction])
+        return summaries
+
+    # Summaries of pure functions which return, computed together as calls of functions depend
+    # on their summaries (recursion starts from functions which are assumed to never return)
+    def run(self):
+        changed = True
+        while(changed):
+            changed = False
+            for target in self.functions:
+                old = self.summaries.get(target)
+                if(old is self.IMPURE):
+                    continue
+                new = self._join(old, self._analyze(target))
+                if(new != old):
+                    self.summaries[target] = new
+                    changed = True
+        return {target: summary for target, summary in self.summaries.items()
+                if summary is not None and summary is not self.IMPURE}
+
+    @staticmethod
+    def _join(old, new):
+        if(old is None or new is Purity.IMPURE):
+            return new
+        if(new is None):
+            return old
+        if(old[1] != new[1] or old[4] != new[4]):
+            return Purity.IMPURE
+        return (max(old[0], new[0]), old[1], old[2] or new[2], old[3] or new[3], old[4])
+
+    # Summary of function, the state before every instruction of its body is stack length (relative
+    # to the call), frames pushed by the function and the temporary frame, it has to be the same
+    # on all paths to the instruction
+    def _analyze(self, start):
+        self._consumed = 0
+        self._reads = False     # Temporary frame of the caller is read
+        self._writes = False    # Temporary frame of the caller is changed or replaced
+        self._returns = set()
+        states = {start: (0, (), 'entry')}
+        pending = [start]
+        while(len(pending) > 0):
+            i = pending.pop()
+            successors = self._step(i, states[i])
+            if(successors is None or self._consumed > self.MAX_CONSUMED):
+                return self.IMPURE
+            for successor, state in successors:
+                old = states.get(successor)
+                if(old is None):
+                    states[successor] = state
+                    pending.append(successor)
+                elif(old != state):
+                    return self.IMPURE
+
+        self.bodies[start] = states
+        if(len(self._returns) == 0):
+            return None
+        if(len(self._returns) > 1):
+            return self.IMPURE
+        change, returned = next(iter(self._returns))
+        return (self._consumed, change, self._reads, self._writes, returned)
+
+    # Instructions where the function continues and their states, None when it is not pure
+    def _step(self, i, state):
+        if(i >= len(self.instructions)):
+            return None
+        instruction = self._original(self.instructions[i])
+        opcode = instruction.opcode
+        depth, lf, tf = state
+        if(opcode in self._impure or not self._operands(instruction, lf, tf)):
+            return None
+
+        if(opcode == 'CREATEFRAME'):
+            self._writes |= tf == 'entry'
+            tf = 'new'
+        elif(opcode == 'PUSHFRAME'):
+            if(tf == 'none'):
+                return None
+            self._reads |= tf == 'entry'
+            self._writes |= tf == 'entry'
+            lf, tf = lf + (tf,), 'none'
+        elif(opcode == 'POPFRAME'):
+            if(len(lf) == 0):
+                return None
+            self._writes |= tf == 'entry'
+            lf, tf = lf[:-1], lf[-1]
+        elif(opcode == 'PUSHS'):
+            depth += 1
+        elif(opcode == 'POPS'):
+            depth -= 1
+            self._consumed = max(self._consumed, -depth)
+        elif(opcode == 'CALL'):
+            summary = self.summaries.get(instruction.target)
+            if(summary is self.IMPURE):
+                return None
+            if(summary is None):
+                return []
+            consumed, change, reads, writes, returned = summary
+            self._consumed = max(self._consumed, consumed - depth)
+            depth += change
+            self._reads |= reads and tf == 'entry'
+            self._writes |= writes and tf == 'entry'
+            if(returned != 'entry'):
+                tf = returned
+            return [(i + 1, (depth, lf, tf))]
+        elif(opcode == 'RETURN'):
+            # Frames of the function are popped, so the caller has the same local frame
+            if(len(lf) > 0):
+                return None
+            self._writes |= tf != 'entry'
+            self._returns.add((depth, tf))
+            return []
+
+        state = (depth, lf, tf)
+        if(opcode == 'JUMP'):
+            return [(instruction.target, state)]
+        if(opcode in ['JUMPIFEQ', 'JUMPIFNEQ']):
+            return [(instruction.target, state), (i + 1, state)]
+        return [(i + 1, state)]
+
+    # Variables of the instruction are in frames of the function or in the temporary frame
+    def _operands(self, instruction, lf, tf):
+        for arg in instruction.args:
+            if(not isinstance(arg, Var)):
+                continue
+            if(arg.frame == 'GF' or (arg.frame == 'LF' and len(lf) == 0) or (arg.frame == 'TF' and tf == 'none')):
+                return False
+            # Variable can be changed by the instruction (or defined by DEFVAR)
+            self._reads |= arg.frame == 'TF' and tf == 'entry'
+            self._writes |= arg.frame == 'TF' and tf == 'entry'
+        return True
+
+    # Superinstructions are analyzed as the instructions they were made of
+    @staticmethod
+    def _original(instruction):
+        while(isinstance(instruction, Superinstruction)):
+            instruction = instruction.fused[0]
+        return instruction
+
+
+# Results of pure functions by their arguments (--memoize), the least recently used result is removed
+# first. Arguments are compared by type and data of the values, so equal strings are the same argument.
+class Memo:
+    SIZE = 4096         # Kept results
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.results = {}       # Key -> (temporary frame, stack values), the oldest first
+        self.pending = []       # Key, call depth, stack length and frame result flag of running memoized calls
+        self.frame_size = None  # Length of frames as lists, None = dictionaries (same as Prog.frame_size)
+        self.functions = 0      # Pure functions found in the program
+        self.hits = 0
+        self.misses = 0
+
+    # Key of the call, None when the stack does not hold the arguments (the call ends with error)
+    def key(self, program, target, consumed, reads):
+        stack = program.stack
+        if(len(stack) < consumed):
+            return None
+        arguments = tuple(self._value(value) for value in stack[len(stack) - consumed:])
+        if(not reads):
+            return (target, arguments)
+        return (target, arguments, self._frame(program.tf))
+
+    def lookup(self, key):
+        result = self.results.pop(key, None)
+        if(result is None):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results[key] = result
+        return result
+
+    # Function starts running, its result is stored when it returns to the call depth
+    def enter(self, key, depth, base, writes):
+        self.pending.append((key, depth, base, writes))
+
+    # Called by RETURN in pure functions before it pops the callstack
+    def leave(self, program):
+        pending = self.pending
+        if(len(pending) == 0 or pending[-1][1] != len(program.callstack)):
+            return
+        key, _, base, writes = pending.pop()
+        tf = program.tf
+        if(writes and tf is not None):
+            tf = tuple(tf) if self.frame_size is not None else tuple(tf.items())
+        self._store(key, (tf if writes else None, tuple(program.stack[base:])))
+
+    # Change the stack and frame as the function would
+    def apply(self, program, result, consumed, writes):
+        tf, values = result
+        stack = program.stack
+        if(consumed > 0):
+            del stack[len(stack) - consumed:]
+        stack.extend(values)
+        if(writes):
+            program.tf = None if tf is None else list(tf) if self.frame_size is not None else dict(tf)
+
+    def _store(self, key, result):
+        if(self.size <= 0):
+            return
+        if(len(self.results) >= self.size):
+            del self.results[next(iter(self.results))]
+        self.results[key] = result
+
+    # Comparable value, StringBuffer is the same as String with its text
+    @staticmethod
+    def _value(value):
+        if(value is None):
+            return None
+        return (String if value.__class__ is StringBuffer else value.__class__, value.data)
+
+    def _frame(self, frame):
+        if(frame is None):
+            return None
+        if(self.frame_size is not None):
+            return tuple(map(self._value, frame))
+        return tuple((name, self._value(value)) for name, value in frame.items())
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Compiled engine, every instruction is turned into a closure with its operands already bound
+class Compiler:
+    def __init__(self, program: Prog):
+        self.program = program
+
+    # Compile the whole program, code[i] executes instruction i and returns index of the next one
+    def compile(self, instructions):
+        # Closures do not form reference cycles, same as in Xml.parser
+        gc.disable()
+        try:
+            code = [instructions[i].compile(self, i) for i in range(len(instructions))]
+        finally:
+            gc.enable()
+        if(self.program.freeze):
+            gc.freeze()
+        return code
+
+    # Exit with error, reported as coming from instruction on given index
+    def error(self, index, message, code):
+        self.program.current_instruction = index
+        Helper.error_exit(message, code, self.program)
+
+    # Closure returning value of variable or constant
+    def reader(self, symb, index):
+        program = self.program
+        error = self.error
+
+        if(not isinstance(symb, Var)):
+            def read():
+                return symb
+            return read
+
+        name = symb.name
+        if(symb.frame == 'GF' and program.gf_slots is not None):
+            slots = program.gf_slots
+            slot = symb.slot
+
+            def read():
+                value = slots[slot]
+                if(value is None):
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+                return value
+        elif(symb.frame == 'GF'):
+            gf = program.gf
+
+            def read():
+                try:
+                    return gf[name]
+                except(KeyError):
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+        elif(symb.frame == 'TF' and program.frame_size is not None):
+            slot = symb.slot
+
+            def read():
+                tf = program.tf
+                if(tf is None):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                value = tf[slot]
+                if(value is None):
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+                return value
+        elif(symb.frame == 'TF'):
+            def read():
+                tf = program.tf
+                if(tf is None):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                try:
+                    return tf[name]
+                except(KeyError):
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+        elif(program.frame_size is not None):
+            lf = program.lf
+            slot = symb.slot
+
+            def read():
+                if(len(lf) == 0):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                value = lf[-1][slot]
+                if(value is None):
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+                return value
+        else:
+            lf = program.lf
+
+            def read():
+                if(len(lf) == 0):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                try:
+                    return lf[-1][name]
+                except(KeyError):
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+        return read
+
+    # Closure writing value to defined variable
+    def writer(self, var, index):
+        program = self.program
+        error = self.error
+        name = var.name
+
+        if(var.frame == 'GF' and program.gf_slots is not None):
+            slots = program.gf_slots
+            slot = var.slot
+
+            def write(value):
+                if(slots[slot] is None):
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+                slots[slot] = value
+        elif(var.frame == 'GF'):
+            gf = program.gf
+
+            def write(value):
+                if(name in gf):
+                    gf[name] = value
+                else:
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+        elif(var.frame == 'TF' and program.frame_size is not None):
+            slot = var.slot
+
+            def write(value):
+                tf = program.tf
+                if(tf is None):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                if(tf[slot] is None):
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+                tf[slot] = value
+        elif(var.frame == 'TF'):
+            def write(value):
+                tf = program.tf
+                if(tf is None):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                if(name in tf):
+                    tf[name] = value
+                else:
+                    error(index, "Variable not defined", Errors.NONEXISTENT_VARIABLE.value)
+        elif(program.frame_size is not None):
+            lf = program.lf
+            slot = var.slot
+
+            def write(value):
+                if(len(lf) == 0 or lf[-1][slot] is None):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                lf[-1][slot] = value
+        else:
+            lf = program.lf
+
+            def write(value):
+                if(len(lf) == 0 or name not in lf[-1]):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                lf[-1][name] = value
+        return write
+
+    # Closure for DEFVAR
+    def definer(self, var, index):
+        program = self.program
+        error = self.error
+        name = var.name
+        following = index + 1
+
+        if(var.frame == 'GF' and program.gf_slots is not None):
+            slots = program.gf_slots
+            slot = var.slot
+
+            def op():
+                if(slots[slot] is not None):
+                    error(index, "Variable already defined", Errors.SEMANTIC_CHECKS.value)
+                slots[slot] = UNDEFINED
+                return following
+        elif(var.frame == 'GF'):
+            gf = program.gf
+
+            def op():
+                if(name in gf):
+                    error(index, "Variable already defined", Errors.SEMANTIC_CHECKS.value)
+                gf[name] = UNDEFINED
+                return following
+        elif(var.frame == 'TF' and program.frame_size is not None):
+            slot = var.slot
+
+            def op():
+                tf = program.tf
+                if(tf is None):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                if(tf[slot] is not None):
+                    error(index, "Variable already defined", Errors.SEMANTIC_CHECKS.value)
+                tf[slot] = UNDEFINED
+                return following
+        elif(var.frame == 'TF'):
+            def op():
+                tf = program.tf
+                if(tf is None):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                if(name in tf):
+                    error(index, "Variable already defined", Errors.SEMANTIC_CHECKS.value)
+                tf[name] = UNDEFINED
+                return following
+        elif(program.frame_size is not None):
+            lf = program.lf
+            slot = var.slot
+
+            def op():
+                if(len(lf) == 0):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                if(lf[-1][slot] is not None):
+                    error(index, "Variable already defined", Errors.SEMANTIC_CHECKS.value)
+                lf[-1][slot] = UNDEFINED
+                return following
+        else:
+            lf = program.lf
+
+            def op():
+                if(len(lf) == 0):
+                    error(index, "Frame not defined", Errors.NONEXISTENT_FRAME.value)
+                if(name in lf[-1]):
+                    error(index, "Variable already defined", Errors.SEMANTIC_CHECKS.value)
+                lf[-1][name] = UNDEFINED
+                return following
+        return op
+
+    # Writer and readers of instruction with <var> <symb1> <symb2> arguments
+    def operands(self, instruction, index):
+        return (self.writer(instruction.get_arg1(), index),
+                self.reader(instruction.get_arg2(), index),
+                self.reader(instruction.get_arg3(), index))
+
+    # ADD, SUB and MUL
+    def arithmetic(self, instruction, index, operation):
+        error = self.error
+        write, read1, read2 = self.operands(instruction, index)
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            if(operand1.__class__ is Int and operand2.__class__ is Int):
+                write(Int.of(operation(operand1.data, operand2.data)))
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+    # LT and GT
+    def relational(self, instruction, index, operation):
+        error = self.error
+        write, read1, read2 = self.operands(instruction, index)
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            type1 = operand1.__class__
+            type2 = operand2.__class__
+            if((type1 is Int and type2 is Int) or (type1 is Bool and type2 is Bool) or
+               (isinstance(operand1, String) and isinstance(operand2, String))):
+                write(TRUE if operation(operand1.data, operand2.data) else FALSE)
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+    # LT, GT and EQ as closure returning the result (compare and branch superinstruction)
+    def comparison(self, instruction, index):
+        error = self.error
+        read1 = self.reader(instruction.get_arg2(), index)
+        read2 = self.reader(instruction.get_arg3(), index)
+        equal = instruction.opcode == 'EQ'
+        operation = {'LT': operator.lt, 'GT': operator.gt, 'EQ': operator.eq}[instruction.opcode]
+
+        def compare():
+            operand1 = read1()
+            operand2 = read2()
+            type1 = operand1.__class__
+            type2 = operand2.__class__
+            if(equal and (type1 is Nil or type2 is Nil)):
+                return TRUE if type1 is type2 else FALSE
+            if((type1 is Int and type2 is Int) or (type1 is Bool and type2 is Bool) or
+               (isinstance(operand1, String) and isinstance(operand2, String))):
+                return TRUE if operation(operand1.data, operand2.data) else FALSE
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return compare
+
+    # AND and OR
+    def logical(self, instruction, index, operation):
+        error = self.error
+        write, read1, read2 = self.operands(instruction, index)
+        following = index + 1
+
+        def op():
+            operand1 = read1()
+            operand2 = read2()
+            if(operand1.__class__ is Bool and operand2.__class__ is Bool):
+                write(TRUE if operation(operand1.data, operand2.data) else FALSE)
+                return following
+            error(index, "Wrong operands", Errors.WRONG_OPERAND_TYPE.value)
+        return op
+
+
+# Compiler evaluating instructions with constant operands (constant folding)
+# Instructions are compiled as usual, but their result is kept instead of written to variable
+class Folder(Compiler):
+    # Error which the instruction would report when run
+    class Unfoldable(Exception):
+        pass
+
+    def __init__(self, program: Prog):
+        super().__init__(program)
+        self._results = []
+
+    # Returns result of the instruction and index of the next one, None when it ends with error
+    def fold(self, instruction, index):
+        self._results.clear()
+        try:
+            following = instruction.compile(self, index)()
+        except(Folder.Unfoldable):
+            return None
+        if(instruction.opcode in ['JUMPIFEQ', 'JUMPIFNEQ']):
+            return None, following
+        if(len(self._results) != 1):
+            return None
+        result = self._results[0]
+        # Folded value is a constant of the program, never a buffer changed in place
+        if(result.__class__ is StringBuffer):
+            result = String(result.data)
+        return result, following
+
+    def error(self, index, message, code):
+        raise Folder.Unfoldable(message)
+
+    def writer(self, var, index):
+        return self._results.append
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Ahead-of-time translation of the program into Python code (aot engine)
+# Every basic block becomes straight-line Python code, jumps set the index of the next block, which is
+# found by the dispatch loop. Global variables are slots of Prog.gf_slots, local and temporary frames
+# stay dictionaries. Translated instruction checks types and variables of its operands first and runs
+# the closure of the compiled engine when they are not as expected, so errors stay the same.
+# Blocks which run at most once are not translated, compiling their code would take longer than running
+# them by the closures.
+class Translator:
+    # Instructions which end the basic block, the translated code sets the next block
+    _transfers = ['JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'CALL', 'RETURN', 'EXIT']
+    # Types compared by LT, GT, EQ and conditional jumps without the closure
+    _comparable = (Int, Bool, String)
+    # Types of string operands of CONCAT, STRLEN, GETCHAR and STRI2INT
+    _strings = (String, StringBuffer)
+    _operators = {'ADD': '+', 'SUB': '-', 'MUL': '*', 'LT': '<', 'GT': '>', 'EQ': '==',
+                  'JUMPIFEQ': '==', 'JUMPIFNEQ': '!='}
+
+    def __init__(self, program: Prog):
+        self.program = program
+        self.compiler = Compiler(program)
+        self._closures = {}     # Instruction index -> closure of the compiled engine
+        self._constants = {}    # id of constant -> its name in the translated code
+        self.namespace = {'Int': Int, 'Bool': Bool, 'String': String, 'Int_of': Int.of,
+                          'TRUE': TRUE, 'FALSE': FALSE, 'UNDEFINED': UNDEFINED,
+                          'COMPARABLE': Translator._comparable,
+                          'StringBuffer': StringBuffer, 'STRINGS': Translator._strings, 'String_concat': String.concat,
+                          'String_char': String.char, 'fallback': self._fallback, 'once': self._once}
+
+    # Translate the program and compile it, returns function running it
+    def compile(self, instructions, dump=None):
+        source = self.translate(instructions)
+        if(dump is not None):
+            dump.write(source)
+            dump.close()
+        exec(compile(source, '<IPPcode23>', 'exec'), self.namespace)
+        return self.namespace['run']
+
+    # Python source of the program, function run(program)
+    def translate(self, instructions):
+        self.instructions = instructions
+        self.repeated = Optimizer._repeated(instructions)
+        leaders = self._leaders(instructions)
+        ends = dict(zip(leaders, leaders[1:] + [len(instructions)]))
+        # Blocks starting with unreachable instruction are never entered
+        leaders = [start for start in leaders if not isinstance(instructions[start], UNREACHABLE)]
+
+        lines = ['# IPPcode23 program translated by interpret.py (--engine aot)',
+                 'def run(program):',
+                 '    g = program.gf_slots',
+                 '    lf = program.lf',
+                 '    stack = program.stack',
+                 '    callstack = program.callstack',
+                 '    write = program.output.write',
+                 '    block = 0',
+                 '    while True:']
+        self._dispatch(leaders, ends, 0, len(leaders), '        ', lines)
+        return '\n'.join(lines) + '\n'
+
+    # Indexes of first instructions of basic blocks, jumps continue after the label (same as closures)
+    def _leaders(self, instructions):
+        leaders = {0}
+        for i in range(len(instructions)):
+            instruction = instructions[i]
+            if(instruction.opcode == 'LABEL' and i + 1 < len(instructions)):
+                leaders.add(i + 1)
+            if(isinstance(instruction, FOLDED) and instruction.value is None):
+                leaders.add(instruction.following)
+            if(instruction.opcode in Translator._transfers and i + 1 < len(instructions)):
+                leaders.add(i + 1)
+        return sorted(leaders)
+
+    # Binary search of the block by its index
+    def _dispatch(self, leaders, ends, low, high, indent, lines):
+        if(high - low == 1):
+            start = leaders[low]
+            lines += [indent + line for line in self._block(start, ends[start])]
+            return
+        middle = (low + high) // 2
+        lines.append(indent + 'if block < %d:' % leaders[middle])
+        self._dispatch(leaders, ends, low, middle, indent + '    ', lines)
+        lines.append(indent + 'else:')
+        self._dispatch(leaders, ends, middle, high, indent + '    ', lines)
+
+    # Code of instructions from start to end
+    def _block(self, start, end):
+        if(not any(self.repeated[start:end])):
+            return ['# %d-%d: run once' % (start, end - 1), 'block = once(%d, %d)' % (start, end)]
+        lines = []
+        for i in range(start, end):
+            instruction = self.instructions[i]
+            lines.append('# %d: %s' % (i, self._describe(instruction)))
+            lines += self._instruction(instruction, i)
+        last = self.instructions[end - 1]
+        if(last.opcode not in Translator._transfers or isinstance(last, UNREACHABLE)):
+            lines.append('block = %d' % end)
+        return lines
+
+    # Instruction as in the source, for comments in the code
+    def _describe(self, instruction):
+        args = []
+        for arg in instruction.args:
+            if(isinstance(arg, Var)):
+                args.append('%s@%s' % (arg.frame, arg.name))
+            elif(isinstance(arg, Label)):
+                args.append(arg.data)
+            elif(isinstance(arg, Bool)):
+                args.append('bool@' + ('true' if arg.data else 'false'))
+            else:
+                args.append('%s@%s' % (arg.__class__.__name__.lower(), arg.data))
+        return repr(' '.join([instruction.opcode] + args))[1:-1]
+
+    # Code of one instruction
+    def _instruction(self, instruction, index):
+        if(isinstance(instruction, UNREACHABLE)):
+            return []
+        if(isinstance(instruction, FOLDED)):
+            return self._folded(instruction, index)
+        if(isinstance(instruction, TAILCALL)):
+            return self._tailcall(instruction, index)
+        if(isinstance(instruction, (MEMOCALL, MEMORETURN))):
+            # Memoized calls and returns are run by their closures, which use the results of the functions
+            return self._transfer(index)
+
+        # Other superinstructions are translated as the instructions they were made of
+        checked = not isinstance(instruction, TYPED)
+        instruction = self._original(instruction)
+        translate = getattr(self, '_' + instruction.opcode, None)
+        lines = None if translate is None else translate(instruction, index, checked)
+        fallback = self._transfer(index) if instruction.opcode in Translator._transfers else ['fallback(%d)' % index]
+        if(lines is None):
+            return fallback
+        if(not checked):
+            # Operands without the proven types are checked by the closure of the original instruction (see TYPED)
+            return (['try:'] + ['    ' + line for line in lines] +
+                    ['except (TypeError, AttributeError):'] + ['    ' + line for line in fallback])
+        return lines
+
+    # Control transfer run by the closure
+    def _transfer(self, index):
+        return ['block = fallback(%d)' % index]
+
+    # Instruction which the superinstruction starts with (memoized calls and returns are kept)
+    def _original(self, instruction):
+        while(isinstance(instruction, Superinstruction) and not isinstance(instruction, (FOLDED, MEMOCALL, MEMORETURN))):
+            instruction = instruction.fused[0]
+        return instruction
+
+    # Run the closure of the compiled engine for instruction, returns index of the next instruction
+    def _fallback(self, index):
+        op = self._closures.get(index)
+        if(op is None):
+            op = self._original(self.program.instructions[index]).compile(self.compiler, index)
+            self._closures[index] = op
+        return op()
+
+    # Run instructions of block by closures of the compiled engine, returns index of the next block
+    def _once(self, start, end):
+        instructions = self.program.instructions
+        index = start
+        while(start <= index < end):
+            index = self._original(instructions[index]).compile(self.compiler, index)()
+        return index
+
+    # Name of the constant in the translated code
+    def _constant(self, const):
+        name = self._constants.get(id(const))
+        if(name is None):
+            name = self._constants[id(const)] = 'k%d' % len(self._constants)
+            self.namespace[name] = const
+        return name
+
+    # Reads operands into local variables, returns expressions of their values and data and conditions
+    # of the fast path, types are the expected classes (None = any value), None when it cannot be taken
+    def _operands(self, symbs, types, checked, lines):
+        values, data, conditions = [], [], []
+        for symb, type, local in zip(symbs, types, ['a', 'b']):
+            if(not isinstance(symb, Var)):
+                if(type is not None and symb.__class__ not in (type if isinstance(type, tuple) else [type])):
+                    return None
+                values.append(self._constant(symb))
+                data.append(repr(symb.data))
+                continue
+
+            lines.append('%s = %s' % (local, self._read(symb)))
+            values.append(local)
+            data.append(local + '.data')
+            if(not checked):
+                continue
+            if(type is None):
+                conditions.append('%s is not None' % local)
+            elif(type is Translator._comparable):
+                conditions.append('%s.__class__ in COMPARABLE' % local)
+            elif(type is Translator._strings):
+                conditions.append('%s.__class__ in STRINGS' % local)
+            else:
+                conditions.append('%s.__class__ is %s' % (local, type.__name__))
+        return values, data, conditions
+
+    # Expression with value of variable, None when the variable or its frame does not exist
+    def _read(self, var):
+        if(var.frame == 'GF'):
+            return 'g[%d]' % var.slot
+        frame, exists, key = self._frame(var)
+        if(var.slot is not None):
+            return '(%s[%s] if %s else None)' % (frame, key, exists)
+        return '(%s.get(%s) if %s else None)' % (frame, key, exists)
+
+    # Condition that variable is defined
+    def _defined(self, var):
+        if(var.frame == 'GF'):
+            return 'g[%d] is not None' % var.slot
+        frame, exists, key = self._frame(var)
+        if(var.slot is not None):
+            return '(%s and %s[%s] is not None)' % (exists, frame, key)
+        return '(%s and %s in %s)' % (exists, key, frame)
+
+    # Statement writing to variable
+    def _write(self, var, value):
+        if(var.frame == 'GF'):
+            return 'g[%d] = %s' % (var.slot, value)
+        frame, _, key = self._frame(var)
+        return '%s[%s] = %s' % (frame, key, value)
+
+    # Temporary or local frame of variable, condition that it exists and key of the variable in it
+    def _frame(self, var):
+        key = repr(var.name) if var.slot is None else str(var.slot)
+        if(var.frame == 'TF'):
+            return 'program.tf', 'program.tf is not None', key
+        return 'lf[-1]', 'lf', key
+
+    # Fast path under conditions, the closure otherwise
+    def _guarded(self, index, conditions, lines, body):
+        if(len(conditions) == 0):
+            return lines + body
+        return (lines + ['if %s:' % ' and '.join(conditions)] + ['    ' + line for line in body] +
+                ['else:', '    ' + self._exit(index)])
+
+    # Statement run when the fast path of instruction cannot be taken
+    def _exit(self, index):
+        return 'fallback(%d)' % index
+
+    # Instruction writing result of its operands to variable
+    def _result(self, instruction, index, checked, types, result, extra=None):
+        lines = []
+        operands = self._operands(instruction.args[1:], types, checked, lines)
+        if(operands is None):
+            return None
+        values, data, conditions = operands
+        if(extra is not None):
+            conditions.append(extra(data))
+        var = instruction.get_arg1()
+        if(checked):
+            conditions.append(self._defined(var))
+        return self._guarded(index, conditions, lines, [self._write(var, result(values, data))])
+
+    def _MOVE(self, instruction, index, checked):
+        return self._result(instruction, index, checked, [None], lambda values, data: values[0])
+
+    def _CREATEFRAME(self, instruction, index, checked):
+        if(self.program.frame_size is not None):
+            return ['program.tf = [None] * %d' % self.program.frame_size]
+        return ['program.tf = {}']
+
+    def _PUSHFRAME(self, instruction, index, checked):
+        return self._guarded(index, ['program.tf is not None'], [], ['lf.append(program.tf)', 'program.tf = None'])
+
+    def _POPFRAME(self, instruction, index, checked):
+        return self._guarded(index, ['lf'], [], ['program.tf = lf.pop()'])
+
+    def _DEFVAR(self, instruction, index, checked):
+        var = instruction.get_arg1()
+        if(var.frame == 'GF'):
+            condition = 'g[%d] is None' % var.slot
+        else:
+            frame, exists, key = self._frame(var)
+            if(var.slot is not None):
+                condition = '(%s and %s[%s] is None)' % (exists, frame, key)
+            else:
+                condition = '(%s and %s not in %s)' % (exists, key, frame)
+        return self._guarded(index, [condition], [], [self._write(var, 'UNDEFINED')])
+
+    def _CALL(self, instruction, index, checked):
+        return ['callstack.append(%d)' % index, 'block = %d' % (instruction.target + 1)]
+
+    # Call in tail position pushes its index only when there is no caller to return to
+    def _tailcall(self, instruction, index):
+        return ['if not callstack:', '    callstack.append(%d)' % index, 'block = %d' % (instruction.target + 1)]
+
+    def _RETURN(self, instruction, index, checked):
+        return ['if callstack:', '    block = callstack.pop() + 1', 'else:', '    block = fallback(%d)' % index]
+
+    def _PUSHS(self, instruction, index, checked):
+        lines = []
+        values, data, conditions = self._operands(instruction.args, [None], checked, lines)
+        return self._guarded(index, conditions, lines, ['stack.append(%s)' % values[0]])
+
+    def _POPS(self, instruction, index, checked):
+        var = instruction.get_arg1()
+        return self._guarded(index, ['stack', self._defined(var)], [], [self._write(var, 'stack.pop()')])
+
+    def _arithmetic(self, instruction, index, checked):
+        operator = Translator._operators[instruction.opcode]
+        return self._result(instruction, index, checked, [Int, Int],
+                            lambda values, data: 'Int_of(%s %s %s)' % (data[0], operator, data[1]))
+
+    _ADD = _SUB = _MUL = _arithmetic
+
+    def _IDIV(self, instruction, index, checked):
+        divisor = instruction.get_arg3()
+        nonzero = lambda data: '%s != 0' % data[1]
+        if(not isinstance(divisor, Var)):
+            if(divisor.data == 0):
+                return None
+            nonzero = None
+        return self._result(instruction, index, checked, [Int, Int],
+                            lambda values, data: 'Int_of(%s // %s)' % (data[0], data[1]), nonzero)
+
+    # Expected types of compared operands, the type of the constant operand or the same comparable type
+    def _compared(self, instruction, checked):
+        constants = [arg for arg in instruction.args[1:] if not isinstance(arg, Var)]
+        if(len(constants) > 0):
+            if(constants[0].__class__ not in Translator._comparable):
+                return None, None
+            return [constants[0].__class__] * 2, None
+        same = (lambda data: 'a.__class__ is b.__class__') if checked else None
+        return [Translator._comparable] * 2, same
+
+    def _relational(self, instruction, index, checked):
+        operator = Translator._operators[instruction.opcode]
+        types, same = self._compared(instruction, checked)
+        if(types is None):
+            return None
+        return self._result(instruction, index, checked, types,
+                            lambda values, data: 'TRUE if %s %s %s else FALSE' % (data[0], operator, data[1]), same)
+
+    _LT = _GT = _EQ = _relational
+
+    def _logical(self, instruction, index, checked):
+        operator = instruction.opcode.lower()
+        return self._result(instruction, index, checked, [Bool, Bool],
+                            lambda values, data: 'TRUE if %s %s %s else FALSE' % (data[0], operator, data[1]))
+
+    _AND = _OR = _logical
+
+    def _NOT(self, instruction, index, checked):
+        return self._result(instruction, index, checked, [Bool],
+                            lambda values, data: 'FALSE if %s else TRUE' % data[0])
+
+    def _CONCAT(self, instruction, index, checked):
+        return self._result(instruction, index, checked, [Translator._strings] * 2,
+                            lambda values, data: 'String_concat(%s, %s)' % (values[0], values[1]))
+
+    # Length of the string operand (read into a), StringBuffer has it without joining the text
+    def _length(self, symb):
+        string = 'a' if isinstance(symb, Var) else self._constant(symb)
+        return '(%s._length if %s.__class__ is StringBuffer else len(%s.data))' % (string, string, string)
+
+    def _STRLEN(self, instruction, index, checked):
+        length = self._length(instruction.get_arg2())
+        return self._result(instruction, index, checked, [Translator._strings],
+                            lambda values, data: 'Int_of(%s)' % length)
+
+    def _GETCHAR(self, instruction, index, checked):
+        length = self._length(instruction.get_arg2())
+        return self._result(instruction, index, checked, [Translator._strings, Int],
+                            lambda values, data: 'String(String_char(%s, %s))' % (values[0], data[1]),
+                            lambda data: '0 <= %s < %s' % (data[1], length))
+
+    def _STRI2INT(self, instruction, index, checked):
+        length = self._length(instruction.get_arg2())
+        return self._result(instruction, index, checked, [Translator._strings, Int],
+                            lambda values, data: 'Int_of(ord(String_char(%s, %s)))' % (values[0], data[1]),
+                            lambda data: '0 <= %s < %s' % (data[1], length))
+
+    def _WRITE(self, instruction, index, checked):
+        symb = instruction.get_arg1()
+        if(not isinstance(symb, Var)):
+            if(symb.__class__ is Int):
+                return ['write(%r)' % str(symb.data)]
+            if(symb.__class__ is String):
+                return [] if symb.data in ['', 'None'] else ['write(%r)' % symb.data]
+            return None
+        # Empty string and string None are not written (same as the other engines)
+        return ['a = %s' % self._read(symb),
+                'if a.__class__ is Int:',
+                '    write(str(a.data))',
+                'elif a.__class__ is String:',
+                "    if a.data != '' and a.data != 'None':",
+                '        write(a.data)',
+                'else:',
+                '    ' + self._exit(index)]
+
+    def _LABEL(self, instruction, index, checked):
+        return []
+
+    def _JUMP(self, instruction, index, checked):
+        return ['block = %d' % (instruction.target + 1)]
+
+    # JUMPIFEQ and JUMPIFNEQ
+    def _conditional(self, instruction, index, checked):
+        operator = Translator._operators[instruction.opcode]
+        target, following = instruction.target + 1, index + 1
+
+        lines = []
+        types, same = self._compared(instruction, checked)
+        operands = None if types is None else self._operands(instruction.args[1:], types, checked, lines)
+        if(operands is None):
+            return self._transfer(index)
+        values, data, conditions = operands
+        if(same is not None):
+            conditions.append(same(data))
+
+        jump = 'block = %d if %s %s %s else %d' % (target, data[0], operator, data[1], following)
+        if(len(conditions) == 0):
+            return lines + [jump]
+        return lines + ['if %s:' % ' and '.join(conditions), '    ' + jump, 'else:'] + ['    ' + line for line in self._transfer(index)]
+
+    _JUMPIFEQ = _JUMPIFNEQ = _conditional
+
+    # Folded instruction writes its result, folded jump continues with the next instruction or after the label
+    def _folded(self, instruction, index):
+        if(instruction.value is None):
+            return ['block = %d' % instruction.following]
+        var = instruction.get_arg1()
+        return self._guarded(index, [self._defined(var)], [], [self._write(var, self._constant(instruction.value))])
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Tiered running (--tiered), instructions run by closures and loops which are entered often by backward
+# jumps (hot loops) are recorded and compiled into traces. Trace is the path through the loop as it was
+# run once, translated into Python code, it leaves to the closures when a guard (operand types, defined
+# variables, frames, the taken branch) does not hold.
+class Tracer:
+    THRESHOLD = 50      # Backward jumps to the loop before it is traced
+    LENGTH = 1000       # Longest recorded trace, longer loops are not traced
+    CACHE_SIZE = 64     # Traces kept at the same time, the oldest is removed first
+
+    def __init__(self, threshold=THRESHOLD, length=LENGTH, cache_size=CACHE_SIZE):
+        self.threshold = threshold
+        self.length = length
+        self.cache_size = cache_size
+        self.counts = {}        # Start of the loop -> number of backward jumps to it
+        self.traces = {}        # Start of the loop -> compiled trace
+        self.aborted = set()    # Starts of loops which could not be recorded
+
+    # Run the program, code[i] is the closure of instruction i
+    def run(self, program, code):
+        translator = TraceTranslator(program)
+        traces = self.traces
+        index = 0
+        end = len(code)
+        while(index < end):
+            following = code[index]()
+            if(following <= index):
+                trace = traces.get(following)
+                if(trace is not None):
+                    following = trace(program)
+                elif(following not in self.aborted):
+                    count = self.counts.get(following, 0) + 1
+                    self.counts[following] = count
+                    if(count >= self.threshold):
+                        following = self._record(following, translator)
+            index = following
+
+    # Run the loop from its start by closures of the original instructions until it gets back,
+    # returns index of the next instruction
+    def _record(self, start, translator):
+        path = []
+        index = start
+        while(len(path) < self.length):
+            path.append(index)
+            index = translator.step(index)
+            if(index == start):
+                self._store(start, translator.trace(path))
+                return index
+        self.aborted.add(start)
+        return index
+
+    def _store(self, start, trace):
+        if(self.cache_size <= 0):
+            return
+        if(len(self.traces) >= self.cache_size):
+            # Removed loop is counted again from zero
+            oldest = next(iter(self.traces))
+            del self.traces[oldest]
+            self.counts.pop(oldest, None)
+        self.traces[start] = trace
+
+
+# Translation of recorded path into a trace, instructions are translated the same way as by the aot
+# engine, but every failed check returns index of the instruction, which the closures run again
+class TraceTranslator(Translator):
+    def __init__(self, program: Prog):
+        super().__init__(program)
+        self.instructions = program.instructions
+        self.following = None   # Index of the instruction after the translated one in the trace
+
+    # Run one original instruction by its closure, returns index of the next one
+    def step(self, index):
+        return self._fallback(index)
+
+    # Compile trace running instructions of path in loop, returns index where the closures continue
+    def trace(self, path):
+        lines = ['def trace(program):',
+                 '    g = program.gf_slots',
+                 '    lf = program.lf',
+                 '    stack = program.stack',
+                 '    callstack = program.callstack',
+                 '    write = program.output.write',
+                 '    while True:']
+        for position in range(len(path)):
+            index = path[position]
+            self.following = path[position + 1] if position + 1 < len(path) else path[0]
+            instruction = self.instructions[index]
+            lines.append('        # %d: %s' % (index, self._describe(instruction)))
+            lines += ['        ' + line for line in self._instruction(instruction, index)]
+
+        exec(compile('\n'.join(lines) + '\n', '<IPPcode23 trace>', 'exec'), self.namespace)
+        return self.namespace['trace']
+
+    def _exit(self, index):
+        return 'return %d' % index
+
+    # Trace is left when the closure does not continue with the next instruction of the trace
+    def _transfer(self, index):
+        return ['following = fallback(%d)' % index, 'if following != %d:' % self.following, '    return following']
+
+    def _CALL(self, instruction, index, checked):
+        return ['callstack.append(%d)' % index]
+
+    # Traces are recorded by closures of the original instructions, so tail calls push their index too
+    def _tailcall(self, instruction, index):
+        return self._CALL(instruction, index, True)
+
+    # Trace continues only when returning to the same call
+    def _RETURN(self, instruction, index, checked):
+        return ['if not callstack or callstack[-1] != %d:' % (self.following - 1),
+                '    return %d' % index,
+                'callstack.pop()']
+
+    def _JUMP(self, instruction, index, checked):
+        return []
+
+    # Conditional jump continues in the trace only in the direction it was recorded
+    def _conditional(self, instruction, index, checked):
+        operator = Translator._operators[instruction.opcode]
+        target = instruction.target + 1
+        other = index + 1 if self.following == target else target
+
+        lines = []
+        types, same = self._compared(instruction, checked)
+        operands = None if types is None else self._operands(instruction.args[1:], types, checked, lines)
+        if(operands is None):
+            return self._transfer(index)
+        values, data, conditions = operands
+        if(same is not None):
+            conditions.append(same(data))
+
+        if(len(conditions) > 0):
+            lines += ['if not (%s):' % ' and '.join(conditions), '    return %d' % index]
+        condition = '%s %s %s' % (data[0], operator, data[1])
+        lines += ['if %s%s:' % ('not ' if self.following == target else '', condition), '    return %d' % other]
+        return lines
+
+    _JUMPIFEQ = _JUMPIFNEQ = _conditional
+
+    def _folded(self, instruction, index):
+        if(instruction.value is None):
+            return []
+        return super()._folded(instruction, index)
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Execution statistics of the program (--stats), collected by a separate instrumented run loop
+class Stats:
+    # Jumps with counted taken and not taken branches
+    _jumps = ['JUMP', 'JUMPIFEQ', 'JUMPIFNEQ']
+
+    def __init__(self, file, format='table'):
+        self.file = file
+        self.format = format    # 'table' or 'json'
+        self.instructions = []
+        self.counts = []        # Executions of every instruction (by index)
+        self.times = []         # Total time of every instruction in seconds
+        self.taken = []         # Taken branches of every jump
+        self.max_stack_depth = 0
+        self.max_call_depth = 0
+        self.initialized_variables = 0  # Variables which got their first value
+        self.tail_calls = 0             # Calls in tail position which did not push to the callstack
+        self.memo = None                # Results of pure functions of the program, None = not memoized
+
+    # Run compiled program, code[i] executes instruction i and returns index of the next one
+    def run(self, program, code, instructions):
+        self.instructions = instructions
+        self.memo = program.memo
+        counts = self.counts = [0] * len(code)
+        times = self.times = [0.0] * len(code)
+        taken = self.taken = [0] * len(code)
+        jumps = [instruction.opcode in self._jumps for instruction in instructions]
+        tails = [isinstance(instruction, TAILCALL) for instruction in instructions]
+        # Variable written by the instruction (reading it does not change whether it is initialized)
+        written = [instruction.args[0] if len(instruction.args) > 0 and isinstance(instruction.args[0], Var) else None
+                   for instruction in instructions]
+        clock = time.perf_counter
+        peek = self._peek
+
+        index = 0
+        end = len(code)
+        while(index < end):
+            var = written[index]
+            if(var is not None):
+                before = peek(program, var)
+
+            depth = len(program.callstack)
+            start = clock()
+            try:
+                following = code[index]()
+            finally:
+                times[index] += clock() - start
+                counts[index] += 1
+
+            if(jumps[index] and following != index + 1):
+                taken[index] += 1
+            if(tails[index] and len(program.callstack) == depth):
+                # RETURN after the call is not run, the callee returns in its place
+                self.tail_calls += 1
+                counts[index + 1] += 1
+            if(var is not None and before is UNDEFINED and peek(program, var) not in [None, UNDEFINED]):
+                self.initialized_variables += 1
+            if(len(program.stack) > self.max_stack_depth):
+                self.max_stack_depth = len(program.stack)
+            if(len(program.callstack) > self.max_call_depth):
+                self.max_call_depth = len(program.callstack)
+            index = following
+
+    # Value of variable without any checks, None when it is not defined
+    @staticmethod
+    def _peek(program, var):
+        if(var.frame == 'GF'):
+            if(program.gf_slots is not None):
+                return program.gf_slots[var.slot]
+            return program.gf.get(var.name)
+        elif(var.frame == 'TF'):
+            return program.frame_value(program.tf, var) if program.tf is not None else None
+        return program.frame_value(program.lf[-1], var) if len(program.lf) > 0 else None
+
+    # Statistics as dictionary
+    def report(self):
+        opcodes = {}
+        for i in range(len(self.counts)):
+            if(self.counts[i] > 0):
+                opcode = opcodes.setdefault(self.instructions[i].opcode, {'count': 0, 'time': 0.0})
+                opcode['count'] += self.counts[i]
+                opcode['time'] += self.times[i]
+
+        return {
+            'instructions': sum(self.counts),
+            'time': sum(self.times),
+            'opcodes': dict(sorted(opcodes.items(), key=lambda item: -item[1]['time'])),
+            'orders': {str(self.instructions[i].order): self.counts[i] for i in range(len(self.counts))
+                       if self.instructions[i].order is not None},
+            'branches': {str(self.instructions[i].order): {'opcode': self.instructions[i].opcode,
+                                                           'taken': self.taken[i],
+                                                           'not_taken': self.counts[i] - self.taken[i]}
+                         for i in range(len(self.counts)) if self.instructions[i].opcode in self._jumps},
+            'max_stack_depth': self.max_stack_depth,
+            'max_call_depth': self.max_call_depth,
+            'initialized_variables': self.initialized_variables,
+            'tail_calls': self.tail_calls,
+            'memo_hits': self.memo.hits if self.memo is not None else 0,
+            'memo_misses': self.memo.misses if self.memo is not None else 0,
+        }
+
+    # Write statistics to the file
+    def write(self):
+        report = self.report()
+        if(self.format == 'json'):
+            json.dump(report, self.file, indent=2)
+            self.file.write('\n')
+        else:
+            self.file.write(self._table(report))
+        self.file.flush()
+
+    @staticmethod
+    def _table(report):
+        lines = ['Instructions executed: %d' % report['instructions'],
+                 'Total time:            %.6f s' % report['time'],
+                 'Max data stack depth:  %d' % report['max_stack_depth'],
+                 'Max call depth:        %d' % report['max_call_depth'],
+                 'Initialized variables: %d' % report['initialized_variables'],
+                 'Tail calls:            %d' % report['tail_calls'],
+                 'Memoized calls:        %d hits, %d misses' % (report['memo_hits'], report['memo_misses']),
+                 '',
+                 '%-12s %12s %12s %8s' % ('opcode', 'count', 'time [s]', 'time %')]
+        total = report['time'] if report['time'] > 0 else 1
+        for opcode, stats in report['opcodes'].items():
+            lines.append('%-12s %12d %12.6f %7.1f%%' % (opcode, stats['count'], stats['time'], 100 * stats['time'] / total))
+
+        lines += ['', '%-12s %12s' % ('order', 'count')]
+        for order, count in report['orders'].items():
+            lines.append('%-12s %12d' % (order, count))
+
+        lines += ['', '%-12s %-12s %12s %12s' % ('order', 'jump', 'taken', 'not taken')]
+        for order, branch in report['branches'].items():
+            lines.append('%-12s %-12s %12d %12d' % (order, branch['opcode'], branch['taken'], branch['not_taken']))
+        return '\n'.join(lines) + '\n'
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Limits of resources of a run (Prog.run), the run ends with error of the first exceeded limit:
+#   60 (INSTRUCTION_LIMIT)  more than the given number of instructions would run
+#   61 (TIME_LIMIT)         the run takes longer than the given number of seconds (wall clock)
+#   62 (STACK_LIMIT)        the data stack is deeper than the given number of values
+#   63 (CALL_LIMIT)         the call stack is deeper than the given number of calls
+#   64 (MEMORY_LIMIT)       values in frames and on the data stack, the frames and the call stack take
+#                           more than the given bytes
+# Time is checked every CHECK_INTERVAL instructions and after every SLOW instruction (working with strings,
+# its time grows with their length, so a few of them can take long). Instructions writing a variable,
+# pushing to the stack, calling or making a frame add the size of the value (return address, frame) to
+# the allocated memory, and sizes of all values are summed when it is more than the rest of the limit
+# (the values are then summed after at least as many bytes as there are values, so that it costs about
+# one value per byte). They are also summed every CHECK_INTERVAL instructions or less often when the
+# program holds many values.
+class Limits:
+    CHECK_INTERVAL = 10000
+    SLOW = ['CONCAT', 'SETCHAR', 'GETCHAR', 'STRI2INT', 'READ', 'WRITE', 'LT', 'GT', 'EQ', 'JUMPIFEQ', 'JUMPIFNEQ']
+
+    def __init__(self, instructions=None, time=None, stack=None, calls=None, memory=None):
+        self.instructions = instructions    # Executed instructions, None = no limit
+        self.time = time                    # Seconds
+        self.stack = stack                  # Values on the data stack
+        self.calls = calls                  # Calls on the call stack
+        self.memory = memory                # Approximate bytes of values
+
+    # Run compiled program, code[i] executes instruction i and returns index of the next one,
+    # skip = instructions falling through to a label continue directly after it (see Prog._skip_labels)
+    def run(self, program, code, skip=False):
+        stack = program.stack
+        callstack = program.callstack
+        max_stack = self.stack if self.stack is not None else sys.maxsize
+        max_calls = self.calls if self.calls is not None else sys.maxsize
+        code, weights, check = self._prepare(program, code, program.instructions)
+        if(skip):
+            program._skip_labels(code, weights)
+
+        index = 0
+        end = len(code)
+        executed = 0
+        following_check = 0
+        while(index < end):
+            executed += weights[index]
+            if(executed > following_check):
+                following_check = check(index, executed)
+            following = code[index]()
+            if(len(stack) > max_stack or len(callstack) > max_calls):
+                self._exceeded(program, index)
+            index = following
+
+    # Closures of the instructions checking the limits themselves, for programs run by another loop
+    # (Stats.run), code[i] executes instructions[i]
+    def limited(self, program, code, instructions):
+        stack = program.stack
+        callstack = program.callstack
+        max_stack = self.stack if self.stack is not None else sys.maxsize
+        max_calls = self.calls if self.calls is not None else sys.maxsize
+        code, weights, check = self._prepare(program, code, instructions)
+        executed = 0
+        following_check = 0
+
+        def limited(index):
+            op = code[index]
+            weight = weights[index]
+
+            def run():
+                nonlocal executed, following_check
+                executed += weight
+                if(executed > following_check):
+                    following_check = check(index, executed)
+                following = op()
+                if(len(stack) > max_stack or len(callstack) > max_calls):
+                    self._exceeded(program, index)
+                return following
+            return run
+        return [limited(i) if code[i] is not None else None for i in range(len(code))]
+
+    # Closures of the instructions with checks of time and memory, weights of the instructions and the
+    # function checking the limits before instruction (see _checker)
+    def _prepare(self, program, code, instructions):
+        check, allocate, overdue = self._checker(program)
+        if(self.memory is not None):
+            # Bytes taken by a call (return address) and by a new frame, see size
+            growth = {'CALL': 8, 'PUSHFRAME': 8, 'CREATEFRAME': sys.getsizeof(program.new_frame())}
+            code = [self._tracked(program, instructions[i], code[i], i, allocate, growth) for i in range(len(code))]
+        if(self.time is not None):
+            code = [self._timed(instructions[i], code[i], i, overdue) for i in range(len(code))]
+        # Superinstruction counts as the instructions it was made of, so the optimizer does not change
+        # the number of executed instructions
+        weights = [len(instruction.fused) if isinstance(instruction, Superinstruction) else 1
+                   for instruction in instructions]
+        return code, weights, check
+
+    # End the run with error of the exceeded stack limit, instruction on index made the stack deeper
+    def _exceeded(self, program, index):
+        program.current_instruction = index
+        if(self.stack is not None and len(program.stack) > self.stack):
+            Helper.error_exit("Data stack limit exceeded", Errors.STACK_LIMIT.value, program)
+        Helper.error_exit("Call stack limit exceeded", Errors.CALL_LIMIT.value, program)
+
+    # Functions checking the limits, check runs before instruction on index (executed includes it) and
+    # returns the number of executed instructions at the next check, allocate counts size of value written
+    # by the instruction, overdue checks the time limit after the instruction
+    def _checker(self, program):
+        deadline = time.monotonic() + self.time if self.time is not None else None
+        memory_check = 0        # Executed instructions at the next check of memory
+        memory_left = 0         # Bytes allocated before the next check of memory
+        # Instructions are not counted to the next check when there is no time and memory limit
+        interval = self.CHECK_INTERVAL if self.time is not None or self.memory is not None else sys.maxsize
+
+        def measure(index):
+            nonlocal memory_left
+            program.current_instruction = index
+            size, values = self.size(program)
+            if(size > self.memory):
+                Helper.error_exit("Memory limit exceeded", Errors.MEMORY_LIMIT.value, program)
+            memory_left = max(self.memory - size, values)
+            return values
+
+        def overdue(index):
+            if(time.monotonic() > deadline):
+                program.current_instruction = index
+                Helper.error_exit("Time limit exceeded", Errors.TIME_LIMIT.value, program)
+
+        def check(index, executed):
+            nonlocal memory_check
+            program.current_instruction = index
+            if(self.instructions is not None and executed > self.instructions):
+                Helper.error_exit("Instruction limit exceeded", Errors.INSTRUCTION_LIMIT.value, program)
+            if(deadline is not None):
+                overdue(index)
+            if(self.memory is not None and executed >= memory_check):
+                memory_check = executed + max(interval, measure(index))
+
+            following = executed + interval
+            if(self.instructions is not None):
+                following = min(following, self.instructions)
+            return following
+
+        def allocate(index, size):
+            nonlocal memory_left
+            memory_left -= size
+            if(memory_left < 0):
+                measure(index)
+        return check, allocate, overdue
+
+    # Closure running op of the instruction and checking the time limit after it, when the instruction
+    # (or one of the fused instructions of superinstruction) is slow
+    @staticmethod
+    def _timed(instruction, op, index, overdue):
+        if(isinstance(instruction, Superinstruction)):
+            slow = any(member.opcode in Limits.SLOW for member in instruction.fused)
+        else:
+            slow = instruction.opcode in Limits.SLOW
+        if(op is None or not slow):
+            return op
+
+        def timed():
+            following = op()
+            overdue(index)
+            return following
+        return timed
+
+    # Closure running op of the instruction and counting sizes of values it writes to variables
+    # (all fused instructions of superinstruction) or pushes to the stack, and of calls and frames
+    # it makes (growth of opcodes)
+    @staticmethod
+    def _tracked(program, instruction, op, index, allocate, growth):
+        if(op is None):
+            return None
+        fused = instruction.fused if isinstance(instruction, Superinstruction) else [instruction]
+        variables = [member.args[0] for member in fused
+                     if member.opcode != 'DEFVAR' and Helper.ExpectedArgs[member.opcode][:1] == [Var]]
+        stack = program.stack if fused == [instruction] and instruction.opcode == 'PUSHS' else None
+        grown = sum(growth.get(member.opcode, 0) for member in fused)
+        if(len(variables) == 0 and stack is None and grown == 0):
+            return op
+        size = Limits._size
+        peek = Stats._peek
+
+        def tracked():
+            following = op()
+            allocated = grown + (size(stack[-1]) if stack is not None else 0)
+            for var in variables:
+                value = peek(program, var)
+                if(value is not None):
+                    allocated += size(value)
+            allocate(index, allocated)
+            return following
+        return tracked
+
+    # Approximate size of values in frames and on the data stack in bytes and the number of values,
+    # the frames, the frame stack and the call stack (return addresses) count too
+    @staticmethod
+    def size(program):
+        frames = [program.gf if program.gf_slots is None else program.gf_slots, program.stack] + program.lf
+        if(program.tf is not None):
+            frames.append(program.tf)
+        size = sys.getsizeof(program.lf) + sys.getsizeof(program.callstack)
+        values = len(frames)
+        for frame in frames:
+            size += sys.getsizeof(frame)
+            for value in (frame.values() if isinstance(frame, dict) else frame):
+                if(value is None):
+                    continue
+                values += 1
+                size += Limits._size(value)
+        return size, values
+
+    # Approximate size of value in bytes
+    @staticmethod
+    def _size(value):
+        # Text of StringBuffer is not joined, its characters are references in a list (or str)
+        if(value.__class__ is StringBuffer):
+            chars = value._chars if value._chars is not None else value._text
+            if(chars.__class__ is list):
+                return sys.getsizeof(value) + 8 * len(chars)
+            return sys.getsizeof(value) + (sys.getsizeof(chars) if chars is not None else 0)
+        return sys.getsizeof(value) + sys.getsizeof(value.data)
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Library interface, runs programs in the calling process
+#
+#   interpreter = Interpreter(engine='compiled')
+#   result = interpreter.run(b'<?xml ...', io.StringIO('input'), io.StringIO())
+#   result.exit_code, result.category, result.counters
+#
+# Source is XML as bytes, path of the XML file, parsed element tree or file object. Errors of loading
+# are raised by load() as InterpretError, run() returns them in the result.
+class Interpreter:
+    def __init__(self, engine='interpret', gf_slots=False, optimize=True, stream=False, cache=None, tracer=None,
+                 stats=None, dump=None, memo=None, limits=None, freeze=False):
+        self.engine = engine
+        self.gf_slots = gf_slots
+        self.optimize = optimize
+        self.stream = stream
+        self.cache = cache      # Cache of loaded programs, None = not used
+        self.tracer = tracer    # Tracer with options for every program, None = no tiered mode
+        self.stats = stats      # Stats with options for every program, None = no statistics
+        self.dump = dump
+        self.memo = memo        # Memo with options for every program, None = calls are not memoized
+        self.limits = limits    # Limits of resources of every run, None = no limits
+        self.freeze = freeze    # Freeze loaded programs (gc.freeze), only for a process which runs one program
+
+    # New program with options of the interpreter, input is empty and output is stdout by default
+    def program(self, input_file=None, output=None):
+        tracer = self.tracer
+        if(tracer is not None):
+            tracer = Tracer(tracer.threshold, tracer.length, tracer.cache_size)
+        memo = self.memo
+        if(memo is not None):
+            memo = Memo(memo.size)
+        stats = self.stats
+        if(stats is not None):
+            stats = Stats(stats.file, stats.format)
+        if(input_file is None):
+            input_file = io.StringIO('')
+        if(output is not None and not isinstance(output, Output)):
+            output = Output(output)
+        return Prog(input_file, self.engine, self.gf_slots, output, stats, self.optimize, self.dump, tracer, memo,
+                    self.freeze)
+
+    # Load program from the source, it can be run once
+    def load(self, source, input_file=None, output=None):
+        program = self.program(input_file, output)
+        if(isinstance(source, (etree.ElementTree, etree.Element))):
+            xml = Xml(source)
+            xml.parser()
+            program.load(xml.get_instructions())
+            return program
+
+        if(isinstance(source, bytes)):
+            source = io.BytesIO(source)
+        elif(isinstance(source, (str, os.PathLike))):
+            try:
+                source = open(source, 'r')
+            except(OSError):
+                Helper.error_exit("Cannot open source file", Errors.INPUT_OPEN.value, None)
+            with source:
+                program.load_source(source, self.stream, self.cache)
+            return program
+        program.load_source(source, self.stream, self.cache)
+        return program
+
+    # Load (unless source is loaded program) and run the program
+    def run(self, source, input_file=None, output=None):
+        start = time.perf_counter()
+        program = None
+        error = None
+        try:
+            if(isinstance(source, Prog)):
+                program = source
+            else:
+                program = self.load(source, input_file, output)
+            code = program.run(limits=self.limits)
+        except(InterpretError) as exception:
+            code = exception.code
+            error = exception
+        return Result(code, error, Interpreter._counters(program, time.perf_counter() - start))
+
+    @staticmethod
+    def _counters(program, time):
+        counters = {'time': time}
+        if(program is None):
+            return counters
+        counters['instructions'] = len(program.instructions)
+        counters['stack_depth'] = len(program.stack)
+        counters['call_depth'] = len(program.callstack)
+        counters['frames'] = len(program.lf)
+        if(program.stats is not None):
+            report = program.stats.report()
+            counters['executed'] = report['instructions']
+            counters['tail_calls'] = report['tail_calls']
+        if(program.memo is not None):
+            counters['memo_functions'] = program.memo.functions
+            counters['memo_hits'] = program.memo.hits
+            counters['memo_misses'] = program.memo.misses
+        return counters
+
+
+# Result of program run by Interpreter
+class Result:
+    def __init__(self, exit_code, error=None, counters=None):
+        self.exit_code = exit_code
+        self.error = error      # InterpretError, None when the program ended by EXIT or at its end
+        self.category = None if error is None else error.category
+        self.counters = counters if counters is not None else {}    # Loaded instructions, stack depth, time, ...
+
+    # Raise error of the run, returns the result when there is none
+    def check(self):
+        if(self.error is not None):
+            raise self.error
+        return self
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
 # Get input files, parse and check them
 class InputFiles:
     def __init__(self):
         self.source_file = None
         self.input_file = None
+        self.engine = None
+        self.gf_slots = False
+        self.output = None
+        self.stream = False
+        self.cache = None
+        self.stats = None
+        self.optimize = True
+        self.dump = None
+        self.tracer = None
+        self.memo = None
+        self.limits = None
+        self.interpreter = None
+        self.batch = None
+        self.server = None
+        self.client = None
+        self.shutdown = False
 
         self._source_filename = None
         self._input_filename = None
@@ -853,9 +4128,74 @@ class InputFiles:
 
         parser.add_argument('--source', help='Source file with XML representation of IPPcode23 source code', required=False)
         parser.add_argument('--input', help='File with inputs for interpretation', required=False)
+        parser.add_argument('--batch', help='Manifest of jobs (JSON lines with source, input and expected output), '
+                                            'runs all of them and writes their results as JSON lines', required=False)
+        parser.add_argument('--jobs', help='Number of worker processes of the batch mode', type=int, default=os.cpu_count())
+        parser.add_argument('--serve', help='Run as server on this Unix socket, programs are sent by --connect', required=False)
+        parser.add_argument('--max-runs', help='Number of programs the server runs at the same time', type=int,
+                            default=Server.MAX_RUNS)
+        parser.add_argument('--program-cache', help='Number of loaded programs kept by the server', type=int,
+                            default=Server.PROGRAMS)
+        parser.add_argument('--connect', help='Run the program on the server listening on this Unix socket', required=False)
+        parser.add_argument('--shutdown', help='Stop the server given by --connect', action='store_true')
+        parser.add_argument('--engine', help='Execution engine, compiled engine turns instructions into closures before running, '
+                                             'aot engine translates the program into Python code (with limits of resources, '
+                                             '--timeout and --max-*, it runs as the compiled engine)',
+                            choices=['interpret', 'compiled', 'aot'], default='interpret')
+        parser.add_argument('--dump-code', help='File for Python code of the program translated by the aot engine',
+                            required=False)
+
+        parser.add_argument('--gf-slots', help='Resolve global variables to fixed slots instead of looking them up by name',
+                            action='store_true')
+        parser.add_argument('--stream', help='Parse the source while reading it, uses less memory for very large programs',
+                            action='store_true')
+        parser.add_argument('--cache-dir', help='Directory for cache of loaded programs, repeated runs of the same source skip parsing',
+                            required=False)
+        parser.add_argument('--cache-size', help='Size limit of the cache directory in bytes, oldest programs are removed first',
+                            type=int, default=Cache.SIZE)
+        parser.add_argument('--output', help='File for output of the interpreted program (default stdout)', required=False)
+        parser.add_argument('--buffer-size', help='Size of output buffer in characters, 0 writes immediately',
+                            type=int, default=Output.BUFFER_SIZE)
+        parser.add_argument('--no-optimize', help='Disable the optimizer: constant folding, dead code elimination, type specialization, '
+                                                  'tail calls and superinstructions (fused instruction sequences and frame '
+                                                  'creation), the program runs as loaded (for debugging)',
+                            action='store_true')
+        parser.add_argument('--tiered', help='Record hot loops of the interpret and compiled engine and run them as compiled traces '
+                                             '(not with limits of resources)',
+                            action='store_true')
+        parser.add_argument('--trace-threshold', help='Number of backward jumps to a loop before it is traced',
+                            type=int, default=Tracer.THRESHOLD)
+        parser.add_argument('--trace-length', help='Maximal number of instructions of a trace, longer loops are not traced',
+                            type=int, default=Tracer.LENGTH)
+        parser.add_argument('--trace-cache', help='Maximal number of compiled traces, the oldest is removed first',
+                            type=int, default=Tracer.CACHE_SIZE)
+        parser.add_argument('--memoize', help='Keep results of pure functions (they use only their arguments on the stack '
+                                              'and in the temporary frame) and reuse them for calls with the same arguments',
+                            action='store_true')
+        parser.add_argument('--memo-size', help='Maximal number of kept results of pure functions, the least recently used is removed first',
+                            type=int, default=Memo.SIZE)
+        parser.add_argument('--max-instructions', help='Stop the program after this number of executed instructions (exit code 60)',
+                            type=int, required=False)
+        parser.add_argument('--timeout', help='Stop the program running longer than this number of seconds (exit code 61)',
+                            type=float, required=False)
+        parser.add_argument('--max-stack', help='Stop the program with more values on the data stack (exit code 62)',
+                            type=int, required=False)
+        parser.add_argument('--max-calls', help='Stop the program with more nested calls (exit code 63)',
+                            type=int, required=False)
+        parser.add_argument('--max-memory', help='Stop the program with values in frames and on the data stack, the frames '
+                                                 'and the call stack taking more than about this number of bytes (exit code 64)', type=int, required=False)
+        parser.add_argument('--stats', help='File for execution statistics (instruction counts and times, branches, stack depths)',
+                            required=False)
+        parser.add_argument('--stats-format', help='Format of execution statistics',
+                            choices=['table', 'json'], default='table')
 
         args = parser.parse_args()
 
+        self.engine = args.engine
+        self.gf_slots = args.gf_slots
+        self.stream = args.stream
+        self.optimize = not args.no_optimize
+
         # Source from file, input from file
         if(args.source is not None and args.input is not None):
             self._source_filename = args.source
@@ -896,23 +4236,419 @@ class InputFiles:
             self.input_file = sys.stdin
 
         # Missing parameter
-        elif(args.source is None and args.input is None):
+        elif(args.source is None and args.input is None and args.batch is None and args.serve is None and not args.shutdown):
             Helper.error_exit("Missing parameter --source or --input", Errors.MISSING_PARAMETER.value, None)
 
+        # Output to file or stdout
+        output_file = sys.stdout
+        if(args.output is not None):
+            try:
+                output_file = open(args.output, 'w')
+            except(IOError, FileNotFoundError):
+                Helper.error_exit("Cannot open output file", Errors.OUTPUT_OPEN.value, None)
+        self.output = Output(output_file, args.buffer_size)
+
+        if(args.cache_dir is not None):
+            self.cache = Cache(args.cache_dir, args.cache_size)
+
+        if(args.stats is not None):
+            try:
+                self.stats = Stats(open(args.stats, 'w'), args.stats_format)
+            except(IOError, FileNotFoundError):
+                Helper.error_exit("Cannot open statistics file", Errors.OUTPUT_OPEN.value, None)
+
+        if(args.tiered):
+            self.tracer = Tracer(args.trace_threshold, args.trace_length, args.trace_cache)
+
+        if(args.memoize):
+            self.memo = Memo(args.memo_size)
+
+        limits = [args.max_instructions, args.timeout, args.max_stack, args.max_calls, args.max_memory]
+        if(any(limit is not None for limit in limits)):
+            self.limits = Limits(*limits)
+
+        if(args.dump_code is not None):
+            try:
+                self.dump = open(args.dump_code, 'w')
+            except(IOError, FileNotFoundError):
+                Helper.error_exit("Cannot open code dump file", Errors.OUTPUT_OPEN.value, None)
+
+        self.interpreter = Interpreter(self.engine, self.gf_slots, self.optimize, self.stream, self.cache, self.tracer,
+                                       self.stats, self.dump, self.memo, self.limits, freeze=True)
+
+        # Programs of the batch mode and of the server do not write statistics and code
+        shared = Interpreter(self.engine, self.gf_slots, self.optimize, self.stream, self.cache, self.tracer,
+                             memo=self.memo, limits=self.limits)
+        if(args.batch is not None):
+            self.batch = Batch(args.batch, args.jobs, shared)
+        if(args.serve is not None):
+            self.server = Server(args.serve, shared, args.max_runs, args.program_cache)
+        if(args.connect is not None):
+            self.client = Client(args.connect)
+            self.shutdown = args.shutdown
+        elif(args.shutdown):
+            Helper.error_exit("Missing parameter --connect", Errors.MISSING_PARAMETER.value, None)
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Input of the interpreted program, read by READ
+# Regular files and in-memory streams are read whole and split to lines once, READ then only takes
+# the next line from the list. Other streams (terminal, pipe) are read line by line through their own
+# buffer, as the rest of the input may not be written yet.
+class Input:
+    def __init__(self, stream):
+        self.stream = stream
+        # Function returning the next line, '' at the end of input (the line break is not always included)
+        if(Input._is_regular(stream)):
+            self.readline = itertools.chain(stream.read().split('\n'), itertools.repeat('')).__next__
+        else:
+            self.readline = stream.readline
+
+    @staticmethod
+    def _is_regular(stream):
+        if(isinstance(stream, io.StringIO)):
+            return True
+        try:
+            return stat.S_ISREG(os.fstat(stream.fileno()).st_mode)
+        except(OSError, ValueError, AttributeError):
+            return False
+
+
+# Buffered output of the interpreted program, written in large blocks instead of for every WRITE
+class Output:
+    BUFFER_SIZE = 65536
+
+    def __init__(self, stream, buffer_size=BUFFER_SIZE):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._size = 0
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if(self._size >= self.buffer_size):
+            self.flush()
+
+    # Write buffered text to the stream
+    def flush(self):
+        if(len(self._buffer) > 0):
+            self.stream.write(''.join(self._buffer))
+            self._buffer.clear()
+            self._size = 0
+        self.stream.flush()
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Batch mode (--batch), runs jobs of a manifest in a pool of worker processes
+# Manifest has one JSON object per line with paths relative to the manifest:
+#   {"id": "add", "source": "add.xml", "input": "add.in", "expected": "add.out", "exit_code": 0}
+# only source is required. Every job runs in its own Prog with captured output and error output,
+# EXIT and errors end only the job. Results are written to stdout as JSON lines in order of the jobs.
+class Batch:
+    _interpreter = None     # Interpreter of the worker process
+
+    def __init__(self, manifest, jobs, interpreter):
+        self.manifest = manifest        # Path of the manifest
+        self.jobs = jobs                # Number of worker processes
+        self.interpreter = interpreter  # Interpreter with options for every job (engine, gf_slots, ...)
+
+    # Run all jobs, returns exit code of the batch (0, or 1 when some job did not pass)
+    def run(self, output=sys.stdout):
+        jobs = self._read_manifest()
+        passed = True
+        with multiprocessing.Pool(self.jobs, Batch._init_worker, (self.interpreter,)) as pool:
+            for result in pool.imap(Batch._run_job, jobs):
+                passed = passed and result.get('passed', True)
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+        return 0 if passed else 1
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest, 'r') as file:
+                lines = file.readlines()
+        except(OSError):
+            Helper.error_exit("Cannot open batch manifest", Errors.INPUT_OPEN.value, None)
+
+        directory = os.path.dirname(os.path.abspath(self.manifest))
+        jobs = []
+        for number, line in enumerate(lines, 1):
+            if(line.strip() == ''):
+                continue
+            try:
+                job = json.loads(line)
+            except(ValueError):
+                job = None
+            if(not isinstance(job, dict) or not isinstance(job.get('source'), str)):
+                Helper.error_exit("Wrong batch manifest on line %d" % number, Errors.MISSING_PARAMETER.value, None)
+
+            job.setdefault('id', number)
+            for name in ['source', 'input', 'expected']:
+                if(job.get(name) is not None):
+                    job[name] = os.path.join(directory, job[name])
+            jobs.append(job)
+        return jobs
+
+    @staticmethod
+    def _init_worker(interpreter):
+        Batch._interpreter = interpreter
+
+    # Run one job in the worker, returns its result
+    @staticmethod
+    def _run_job(job):
+        output = io.StringIO()
+        start = time.perf_counter()
+        code, errors = Helper.run_captured(lambda: Batch._run_program(job, output, Batch._interpreter))
+
+        result = {'id': job['id'], 'exit_code': code, 'stdout': output.getvalue(), 'stderr': errors,
+                  'time': time.perf_counter() - start}
+        if(job.get('expected') is not None or job.get('exit_code') is not None):
+            result['passed'] = code == job.get('exit_code', 0) and Batch._expected(job, result['stdout'])
+        return result
+
+    @staticmethod
+    def _run_program(job, output, interpreter):
+        files = []
+        try:
+            try:
+                source_file = open(job['source'], 'r')
+                files.append(source_file)
+                input_file = io.StringIO('')
+                if(job.get('input') is not None):
+                    input_file = open(job['input'], 'r')
+                    files.append(input_file)
+            except(OSError):
+                Helper.error_exit("Cannot open source file", Errors.INPUT_OPEN.value, None)
+
+            return interpreter.load(source_file, input_file, Output(output)).run(limits=interpreter.limits)
+        finally:
+            for file in files:
+                file.close()
+
+    # Output of the job is the same as the expected one (or nothing is expected)
+    @staticmethod
+    def _expected(job, stdout):
+        if(job.get('expected') is None):
+            return True
+        try:
+            with open(job['expected'], 'r') as file:
+                return file.read() == stdout
+        except(OSError):
+            return False
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+# Server mode (--serve), runs programs sent over Unix domain socket without starting the interpreter
+# Request is one JSON object per connection (client ends its writing), the response is sent back:
+#   {"key": sha256 of source, "source": XML (optional when the server knows the key), "input": text}
+#   {"stdout": text, "stderr": text, "exit_code": code}, or {"missing": true} when the key is unknown
+#   {"shutdown": true} stops the server after the running programs end (same as SIGTERM and SIGINT)
+# Loaded programs are kept in LRU cache, every run is a forked process with its own copy of the program.
+class Server:
+    MAX_RUNS = os.cpu_count()   # Programs running at the same time
+    PROGRAMS = 32               # Loaded programs kept in memory
+    REQUEST_TIMEOUT = 1         # Seconds for receiving the request, a slow client does not hold up the others
+
+    def __init__(self, path, interpreter, max_runs=MAX_RUNS, programs=PROGRAMS):
+        self.path = path
+        self.interpreter = interpreter  # Interpreter with options for every program
+        self.max_runs = max_runs
+        self.programs = programs
+        self._loaded = {}       # Key -> loaded program, ordered from the least recently used
+        self._runs = set()      # Process ids of running programs
+        self._stopping = False
+
+    # Key of the program source
+    @staticmethod
+    def key(source):
+        return hashlib.sha256(source.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    # Serve requests until shutdown
+    def run(self):
+        try:
+            if(os.path.exists(self.path)):
+                os.unlink(self.path)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.path)
+            listener.listen()
+        except(OSError):
+            Helper.error_exit("Cannot open server socket", Errors.OUTPUT_OPEN.value, None)
+
+        stop = lambda signum, frame: self.stop()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        # Accept waits at most a second, so that the shutdown is noticed
+        listener.settimeout(1)
+        try:
+            while(not self._stopping):
+                self._wait(len(self._runs) >= self.max_runs)
+                try:
+                    connection, _ = listener.accept()
+                except(socket.timeout, InterruptedError):
+                    continue
+                with connection:
+                    try:
+                        self._serve(connection)
+                    except(OSError):
+                        # Client has gone away before its response was sent
+                        pass
+        finally:
+            listener.close()
+            os.unlink(self.path)
+            while(len(self._runs) > 0):
+                self._wait(True)
+
+    # Stop accepting requests, the running programs are finished
+    def stop(self):
+        self._stopping = True
+
+    # Remove ended runs, with block waits until at least one of them ends
+    def _wait(self, block):
+        while(len(self._runs) > 0):
+            try:
+                pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except(ChildProcessError):
+                self._runs.clear()
+                return
+            if(pid == 0):
+                return
+            self._runs.discard(pid)
+            block = False
+
+    def _serve(self, connection):
+        try:
+            request = json.loads(Server.receive(connection, time.monotonic() + Server.REQUEST_TIMEOUT))
+        except(OSError, ValueError):
+            return
+        # Response is sent when the program ends
+        connection.settimeout(None)
+        if(not isinstance(request, dict)):
+            return
+        if(request.get('shutdown')):
+            self.stop()
+            Server.send(connection, {})
+            return
+
+        key = request.get('key')
+        source = request.get('source')
+        if(source is not None):
+            key = Server.key(source)
+        program = self._loaded.get(key)
+        if(program is None):
+            if(source is None):
+                Server.send(connection, {'missing': True})
+                return
+            program, response = self._load(source)
+            if(program is None):
+                Server.send(connection, response)
+                return
+            self._loaded[key] = program
+            if(len(self._loaded) > self.programs):
+                del self._loaded[next(iter(self._loaded))]
+        else:
+            # Move to the end as the most recently used
+            self._loaded[key] = self._loaded.pop(key)
+
+        pid = os.fork()
+        if(pid != 0):
+            self._runs.add(pid)
+            return
+
+        # Run in the child process, which ends without returning to the server loop
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            gc.freeze()
+            output = io.StringIO()
+            program.input = Input(io.StringIO(request.get('input', '')))
+            program.output = Output(output)
+            code, errors = Helper.run_captured(lambda: program.run(limits=self.interpreter.limits))
+            Server.send(connection, {'stdout': output.getvalue(), 'stderr': errors, 'exit_code': code})
+        finally:
+            os._exit(0)
+
+    # Load program, returns it, or None and the response with error of the source
+    def _load(self, source):
+        try:
+            program = self.interpreter.load(io.StringIO(source))
+        except(InterpretError) as error:
+            return None, {'stdout': '', 'stderr': error.report(), 'exit_code': error.code}
+        return program, None
+
+    # Read the whole message, the other side ends its writing after it, socket.timeout is raised
+    # when it is not read until the deadline (time.monotonic(), None = wait as long as needed)
+    @staticmethod
+    def receive(connection, deadline=None):
+        chunks = []
+        while(True):
+            if(deadline is not None):
+                timeout = deadline - time.monotonic()
+                if(timeout <= 0):
+                    raise socket.timeout("Message not received in time")
+                connection.settimeout(timeout)
+            chunk = connection.recv(65536)
+            if(chunk == b''):
+                return b''.join(chunks).decode('utf-8', 'surrogatepass')
+            chunks.append(chunk)
+
+    @staticmethod
+    def send(connection, message):
+        connection.sendall(json.dumps(message).encode('utf-8', 'surrogatepass'))
+        connection.shutdown(socket.SHUT_WR)
+
+
+# Client of the server (--connect), runs the program given by --source and --input on the server
+class Client:
+    def __init__(self, path):
+        self.path = path
+
+    # Run the program, returns exit code, output and error output
+    def run(self, source, input_data):
+        key = Server.key(source)
+        response = self._request({'key': key, 'input': input_data})
+        if(response.get('missing')):
+            response = self._request({'key': key, 'source': source, 'input': input_data})
+        return response['exit_code'], response['stdout'], response['stderr']
+
+    # Stop the server
+    def shutdown(self):
+        self._request({'shutdown': True})
+
+    def _request(self, message):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.connect(self.path)
+                Server.send(connection, message)
+                return json.loads(Server.receive(connection))
+        except(OSError, ValueError):
+            Helper.error_exit("Cannot connect to server", Errors.INTERNAL.value, None)
+
 # ------------------–------------------–------------------–------------------–------------------ #
 
 # Class for XML parsing
 class Xml:
     # Input file is XML representation of IPPcode23 source code
-    def __init__(self, input_file):
+    def __init__(self, input_file, stream=False):
         self.xml_root = None
         self._header = None
         self._instructions = None
         self.input_file = input_file
+        self.stream = stream    # Parse instructions while reading the file, without building the tree
 
-        self._get_root()
+        if(not self.stream):
+            self._get_root()
 
     def _get_root(self):
+        # Already parsed tree
+        if(isinstance(self.input_file, etree.ElementTree)):
+            self.xml_root = self.input_file.getroot()
+            return
+        if(isinstance(self.input_file, etree.Element)):
+            self.xml_root = self.input_file
+            return
+
         try:
             self.xml_root = etree.parse(self.input_file).getroot()
         except(etree.ParseError):
@@ -920,155 +4656,418 @@ class Xml:
 
     # Parse XML to instructions
     def parser(self):
-        instructions = {}
+        # Program objects do not form reference cycles, the cycle collector would only
+        # keep rescanning the growing number of them
+        gc.disable()
+        try:
+            if(self.stream):
+                self._stream_parser()
+            else:
+                self._tree_parser()
+        finally:
+            gc.enable()
 
-        tag = self.xml_root.tag
-        if(tag != 'program'):
-            Helper.error_exit("Unexpected XML structure", Errors.WRONG_XML_FORMAT.value, None)
+    def _tree_parser(self):
+        instructions = {}
 
-        lang = self.xml_root.attrib.get('language')
-        if(lang != 'IPPcode23'):
-            Helper.error_exit("Wrong language", Errors.UNEXPECTED_XML_STRUCT.value, None)
+        self._check_program(self.xml_root)
 
         for instruction in self.xml_root:
-            tag = instruction.tag
-            if(tag != 'instruction'):
-                Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
+            order, instruction = self._parse_instruction(instruction)
 
-            order = instruction.attrib.get('order').strip()
-            if(order is None):
+            # Check if order is already in dictionary
+            if(order in instructions):
                 Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
-            elif(int(order) < 1):
-                Helper.error_exit("Wrong order", Errors.UNEXPECTED_XML_STRUCT.value, None)
-            order = int(order)
+            instructions[order] = instruction
 
-            opcode = instruction.attrib.get('opcode').upper()
-            if(opcode is None):
-                Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
+        # array to list
+        instructions = [instructions[i] for i in sorted(instructions.keys())]
 
-            if (opcode not in Helper.Opcodes):
-                Helper.error_exit("Unknown opcode", Errors.WRONG_OPCODE.value, None)
+        instructions.append(EXIT('EXIT', [Int(0)], None))
 
-            expected_args = Helper.ExpectedArgs[opcode]
-            args_dict = {}
+        self._instructions = instructions
 
-            for arg in instruction:
+    # Parse XML to instructions while reading it, every instruction element is freed right after
+    # it is converted, so the whole tree is never held in memory
+    def _stream_parser(self):
+        instructions = []
+        orders = None           # Set of used orders, needed only when orders are not ascending
+        last_order = 0
+        root = None
+        depth = 0
 
-                arg_order = arg.tag
-                if(arg_order not in ['arg1', 'arg2', 'arg3']):
-                    Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
+        try:
+            for event, element in etree.iterparse(self.input_file, events=('start', 'end')):
+                if(event == 'start'):
+                    depth += 1
+                    if(root is None):
+                        root = element
+                        self._check_program(root)
+                    continue
+
+                depth -= 1
+                if(depth != 1):
+                    continue
+
+                order, instruction = self._parse_instruction(element)
+
+                # Check if order is already used
+                if(order <= last_order):
+                    if(orders is None):
+                        orders = set(order for order, _ in instructions)
+                    if(order in orders):
+                        Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
+                else:
+                    last_order = order
+                if(orders is not None):
+                    orders.add(order)
+                instructions.append((order, instruction))
 
-                arg_type = arg.attrib.get('type')
+                del root[:]
+        except(etree.ParseError):
+            Helper.error_exit("Wrong XML format", Errors.WRONG_XML_FORMAT.value, None)
 
-                if(arg.text is not None):
-                    arg.text = arg.text.strip()
+        if(orders is not None):
+            instructions.sort(key=lambda item: item[0])
+        instructions = [instruction for _, instruction in instructions]
 
-                if(arg_type is None):
-                    Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
+        instructions.append(EXIT('EXIT', [Int(0)], None))
 
-                elif(arg_type == 'var'):
-                    var_frame = arg.text.split('@')[0]
-                    var_name = arg.text.split('@')[1]
-                    if(var_frame not in ['GF', 'LF', 'TF']):
-                        Helper.error_exit("Unexpected XML structure", Errors.SEMANTIC_CHECKS.value, None)
+        self._instructions = instructions
 
-                    argument = Var(var_frame, var_name, None)
+    # Check the root element of the program
+    def _check_program(self, root):
+        tag = root.tag
+        if(tag != 'program'):
+            Helper.error_exit("Unexpected XML structure", Errors.WRONG_XML_FORMAT.value, None)
 
-                elif(arg_type == 'label'):
-                    argument = Label(arg.text)
+        lang = root.attrib.get('language')
+        if(lang != 'IPPcode23'):
+            Helper.error_exit("Wrong language", Errors.UNEXPECTED_XML_STRUCT.value, None)
 
-                elif(arg_type == 'type'):
-                    argument = Type(arg.text)
+    # Check instruction element and convert it to instruction, returns its order and the instruction
+    def _parse_instruction(self, instruction):
+        tag = instruction.tag
+        if(tag != 'instruction'):
+            Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
 
-                elif(arg_type == 'int'):
-                    argument = Int(int(arg.text))
+        order = instruction.attrib.get('order').strip()
+        if(order is None):
+            Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
+        elif(int(order) < 1):
+            Helper.error_exit("Wrong order", Errors.UNEXPECTED_XML_STRUCT.value, None)
+        order = int(order)
 
-                elif(arg_type == 'bool'):
-                    if(arg.text.lower() == 'true'):
-                        argument = Bool(True)
-                    if(arg.text.lower() == 'false'):
-                        argument = Bool(False)
+        opcode = instruction.attrib.get('opcode').upper()
+        if(opcode is None):
+            Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
 
-                elif(arg_type == 'string'):
-                    string = Helper.string_escape(arg.text)
-                    argument = String(str(string))
+        if (opcode not in Helper.Opcodes):
+            Helper.error_exit("Unknown opcode", Errors.WRONG_OPCODE.value, None)
 
-                elif(arg_type == 'nil'):
-                    argument = Nil()
+        expected_args = Helper.ExpectedArgs[opcode]
+        args_dict = {}
 
-                elif(arg_type == 'label'):
-                    argument = Label(arg.text)
+        for arg in instruction:
 
-                # Check if argument is already in dictionary
-                if(arg_order in args_dict):
-                    Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
+            arg_order = arg.tag
+            if(arg_order not in ['arg1', 'arg2', 'arg3']):
+                Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
 
-                args_dict[arg_order] = argument
+            arg_type = arg.attrib.get('type')
 
-            args = []
-            if('arg1' in args_dict):
-                args.append(args_dict['arg1'])
-                if('arg2' in args_dict):
-                    args.append(args_dict['arg2'])
-                    if('arg3' in args_dict):
-                        args.append(args_dict['arg3'])
-
-            if(len(args) != len(Helper.ExpectedArgs[opcode])):
-                Helper.error_exit("Wrong number of arguments", Errors.UNEXPECTED_XML_STRUCT.value, None)
-
-            if(len(args) == 1):
-                if(not isinstance(args[0], expected_args[0])):
-                    Helper.error_exit("Wrong operand type", Errors.OTHER_LEX_SYNT.value, None)
-            elif(len(args) == 2):
-                if(not isinstance(args[0], expected_args[0]) or
-                   not isinstance(args[1], expected_args[1])):
-                    Helper.error_exit("Wrong operand type", Errors.OTHER_LEX_SYNT.value, None)
-            elif(len(args) == 3):
-                if(not isinstance(args[0], expected_args[0]) or
-                   not isinstance(args[1], expected_args[1]) or
-                   not isinstance(args[2], expected_args[2])):
-                    Helper.error_exit("Wrong operand type", Errors.OTHER_LEX_SYNT.value, None)
+            if(arg.text is not None):
+                arg.text = arg.text.strip()
 
-            # Check if order is already in dictionary
-            if(order in instructions):
+            if(arg_type is None):
                 Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
-            instructions[order] = eval(opcode)(opcode, args, None)
 
-        # array to list
-        instructions = [instructions[i] for i in sorted(instructions.keys())]
+            elif(arg_type == 'var'):
+                var_frame = arg.text.split('@')[0]
+                var_name = arg.text.split('@')[1]
+                if(var_frame not in ['GF', 'LF', 'TF']):
+                    Helper.error_exit("Unexpected XML structure", Errors.SEMANTIC_CHECKS.value, None)
 
-        instructions.append(EXIT('EXIT', [Int(0)], None))
+                argument = Var(var_frame, var_name, None)
 
-        self._instructions = instructions
+            elif(arg_type == 'label'):
+                argument = Label(arg.text)
+
+            elif(arg_type == 'type'):
+                argument = Type(arg.text)
+
+            elif(arg_type == 'int'):
+                argument = Int.of(int(arg.text))
+
+            elif(arg_type == 'bool'):
+                if(arg.text.lower() == 'true'):
+                    argument = TRUE
+                if(arg.text.lower() == 'false'):
+                    argument = FALSE
+
+            elif(arg_type == 'string'):
+                string = Helper.string_escape(arg.text)
+                argument = String(str(string))
+
+            elif(arg_type == 'nil'):
+                argument = NIL
+
+            elif(arg_type == 'label'):
+                argument = Label(arg.text)
+
+            # Check if argument is already in dictionary
+            if(arg_order in args_dict):
+                Helper.error_exit("Unexpected XML structure", Errors.UNEXPECTED_XML_STRUCT.value, None)
+
+            args_dict[arg_order] = argument
+
+        args = []
+        if('arg1' in args_dict):
+            args.append(args_dict['arg1'])
+            if('arg2' in args_dict):
+                args.append(args_dict['arg2'])
+                if('arg3' in args_dict):
+                    args.append(args_dict['arg3'])
+
+        if(len(args) != len(Helper.ExpectedArgs[opcode])):
+            Helper.error_exit("Wrong number of arguments", Errors.UNEXPECTED_XML_STRUCT.value, None)
+
+        if(len(args) == 1):
+            if(not isinstance(args[0], expected_args[0])):
+                Helper.error_exit("Wrong operand type", Errors.OTHER_LEX_SYNT.value, None)
+        elif(len(args) == 2):
+            if(not isinstance(args[0], expected_args[0]) or
+               not isinstance(args[1], expected_args[1])):
+                Helper.error_exit("Wrong operand type", Errors.OTHER_LEX_SYNT.value, None)
+        elif(len(args) == 3):
+            if(not isinstance(args[0], expected_args[0]) or
+               not isinstance(args[1], expected_args[1]) or
+               not isinstance(args[2], expected_args[2])):
+                Helper.error_exit("Wrong operand type", Errors.OTHER_LEX_SYNT.value, None)
+
+        instruction = Helper.Instructions[opcode](opcode, args, None)
+        instruction.order = order
+        return order, instruction
 
     def get_instructions(self):
         return self._instructions
 
 # ------------------–------------------–------------------–------------------–------------------ #
 
+# On-disk cache of loaded programs, keyed by hash of the source and of the interpreter
+# Entries are checked instructions with resolved labels in marshal format, so loading them
+# skips XML parsing, argument checks and string escapes
+class Cache:
+    SIZE = 64 * 1024 * 1024
+    MAGIC = b'IPPcode23 cache 2\n'
+    SUFFIX = '.ippc'
+
+    # Kinds of arguments in the serialized form
+    _kinds = {Var: 'v', Label: 'l', Type: 't', Int: 'i', String: 's', Bool: 'b', Nil: 'n'}
+
+    def __init__(self, directory, size=SIZE):
+        self.directory = directory
+        self.size = size
+
+    # Key of the source text
+    def key(self, source):
+        digest = hashlib.sha256()
+        digest.update(self.MAGIC)
+        digest.update(str(marshal.version).encode())
+        digest.update(Cache._interpreter_hash())
+        digest.update(source if isinstance(source, bytes) else source.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    # Return instructions and labels of cached program, None when missing, stale or corrupt
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except(OSError):
+            return None
+
+        header = len(self.MAGIC) + 32
+        payload = data[header:]
+        if(data[:len(self.MAGIC)] != self.MAGIC or data[len(self.MAGIC):header] != hashlib.sha256(payload).digest()):
+            self._remove(path)
+            return None
+        try:
+            instructions, labels = self._decode(marshal.loads(payload))
+        except(ValueError, EOFError, TypeError, KeyError, IndexError):
+            self._remove(path)
+            return None
+
+        # Recently used entries are evicted last
+        try:
+            os.utime(path)
+        except(OSError):
+            pass
+        return instructions, labels
+
+    # Store loaded program, failures only mean the program is not cached
+    def store(self, key, instructions, labels):
+        payload = marshal.dumps(self._encode(instructions, labels))
+        data = self.MAGIC + hashlib.sha256(payload).digest() + payload
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            file, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(file, 'wb') as file:
+                file.write(data)
+            os.replace(temp, self._path(key))
+        except(OSError):
+            return
+        self._evict()
+
+    # Remove least recently used entries until the directory fits the size limit
+    def _evict(self):
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as directory:
+                for entry in directory:
+                    if(entry.name.endswith(self.SUFFIX)):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+        except(OSError):
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if(total <= self.size):
+                break
+            self._remove(path)
+            total -= size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except(OSError):
+            pass
+
+    @staticmethod
+    def _interpreter_hash():
+        try:
+            with open(os.path.abspath(__file__), 'rb') as file:
+                return hashlib.sha256(file.read()).digest()
+        except(OSError, NameError):
+            return b''
+
+    # Program as tuples of plain values
+    def _encode(self, instructions, labels):
+        encoded = []
+        for instruction in instructions:
+            args = []
+            for arg in instruction.args:
+                if(isinstance(arg, Var)):
+                    args.append(('v', arg.frame, arg.name))
+                else:
+                    args.append((self._kinds[type(arg)], arg.data))
+            encoded.append((instruction.opcode, tuple(args), instruction.target, instruction.order))
+        return (tuple(encoded), labels)
+
+    # Program from tuples of plain values
+    def _decode(self, encoded):
+        program, labels = encoded
+        instructions = []
+        for opcode, args, target, order in program:
+            decoded = []
+            for arg in args:
+                kind = arg[0]
+                if(kind == 'v'):
+                    decoded.append(Var(arg[1], arg[2], None))
+                elif(kind == 'l'):
+                    decoded.append(Label(arg[1]))
+                elif(kind == 't'):
+                    decoded.append(Type(arg[1]))
+                elif(kind == 'i'):
+                    decoded.append(Int.of(arg[1]))
+                elif(kind == 's'):
+                    decoded.append(String(arg[1]))
+                elif(kind == 'b'):
+                    decoded.append(Bool.of(arg[1]))
+                elif(kind == 'n'):
+                    decoded.append(NIL)
+                else:
+                    raise ValueError(kind)
+            instruction = Helper.Instructions[opcode](opcode, decoded, None)
+            instruction.target = target
+            instruction.order = order
+            instructions.append(instruction)
+        if(not isinstance(labels, dict)):
+            raise TypeError(labels)
+        return instructions, labels
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
 # Helper class with static methods useful everywhere
 class Helper:
+    # Decoded strings, mostly repeated literals and input lines
+    _escapes = {}
+    _escapes_size = 4096        # Number of cached strings
+    _escapes_length = 256       # Longer strings are not cached
+
     @staticmethod
     def string_escape(string):
-        if(string is not None):
-            index = 0
-            while(string.find('\\') != -1):
-                index = str.find(string, '\\', index)
-                if(string[index+1].isdigit() and
-                string[index+2].isdigit() and
-                string[index+3].isdigit()):
-                    string = string[:index] + chr(int(string[index+1:index+4])) + string[index+4:]
-                else:
-                    index += 1
-        return string
+        if(string is None or '\\' not in string):
+            return string
+        if(len(string) > Helper._escapes_length):
+            return Helper._decode_escapes(string)
+
+        decoded = Helper._escapes.get(string)
+        if(decoded is None):
+            decoded = Helper._decode_escapes(string)
+            if(len(Helper._escapes) >= Helper._escapes_size):
+                Helper._escapes.clear()
+            Helper._escapes[string] = decoded
+        return decoded
+
+    # Replace escape sequences \ddd in one pass from left to right, decoded characters are not read again
+    # (backslash decoded from \092 does not start another escape sequence), backslash not followed by
+    # three digits (also at the end of string) is kept as it is
+    @staticmethod
+    def _decode_escapes(string):
+        parts = []
+        start = 0               # Beginning of text not copied to parts yet
+        index = string.find('\\')
+        while(index != -1):
+            code = string[index+1:index+4]
+            if(len(code) == 3 and code.isdecimal()):
+                parts.append(string[start:index])
+                parts.append(chr(int(code)))
+                start = index + 4
+                index = string.find('\\', start)
+            else:
+                index = string.find('\\', index + 1)
+        parts.append(string[start:])
+        return ''.join(parts)
 
+    # Run function returning exit code with captured error output (DPRINT, BREAK and errors)
+    # Returns exit code and the error output
+    @staticmethod
+    def run_captured(function):
+        errors = io.StringIO()
+        with contextlib.redirect_stderr(errors):
+            try:
+                code = function()
+            except(InterpretError) as error:
+                sys.stderr.write(error.report())
+                code = error.code
+            except(Exception):
+                traceback.print_exc()
+                code = Errors.INTERNAL.value
+        return code, errors.getvalue()
+
+    # Stop the program (or the interpreter when prog is None) with error, the command line interface
+    # reports it and exits with its code
     @staticmethod
     def error_exit(error, code, prog):
-        if(prog is not None):
-            print("ERROR "+str(code)+": "+str(error)+".\nCalled from "+str(prog.instructions[prog.current_instruction].opcode)+"("+str(prog.current_instruction)+").", file=sys.stderr)
-        else:
-            print("ERROR "+str(code)+": "+str(error), file=sys.stderr)
-        sys.exit(code)
+        raise InterpretError(error, code, prog)
 
     Opcodes = [
         "MOVE",
@@ -1108,6 +5107,17 @@ class Helper:
         "BREAK"
     ]
 
+    # Opcodes which have a label as their target
+    Branches = [
+        "CALL",
+        "JUMP",
+        "JUMPIFEQ",
+        "JUMPIFNEQ"
+    ]
+
+    # Instruction class of every opcode
+    Instructions = {opcode: globals()[opcode] for opcode in Opcodes}
+
     ExpectedArgs = {
         "MOVE":[Var, Symb],
         "CREATEFRAME":[],
@@ -1168,26 +5178,70 @@ class Errors(Enum):
     MISSING_VALUE = 56
     WRONG_OPERANT_VALUE = 57
     WRONG_STRING = 58
+    # Limits of resources (Limits), the run was stopped
+    INSTRUCTION_LIMIT = 60
+    TIME_LIMIT = 61
+    STACK_LIMIT = 62
+    CALL_LIMIT = 63
+    MEMORY_LIMIT = 64
     # Other
     INTERNAL = 99
 
+# Error of the program or of the interpreter input, code is the exit code from Errors
+# Errors of instructions have opcode and index of the instruction, others have None
+class InterpretError(Exception):
+    def __init__(self, message, code, program=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.category = Errors(code).name
+        self.opcode = None
+        self.index = None
+        if(program is not None):
+            self.index = program.current_instruction
+            self.opcode = program.instructions[self.index].opcode
+
+    # Message written to the error output
+    def report(self):
+        if(self.opcode is None):
+            return "ERROR "+str(self.code)+": "+str(self.message)+"\n"
+        return "ERROR "+str(self.code)+": "+str(self.message)+".\nCalled from "+str(self.opcode)+"("+str(self.index)+").\n"
+
+# Program ended by EXIT instruction
+class ProgramExit(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
 # ------------------–------------------–------------------–------------------–------------------ #
 
 # Main function
 if __name__ == '__main__':
-
-    # Get command line arguments = inputs and check them
-    inputs = InputFiles()
-
-    # Parse XML file
-    xml = Xml(inputs.source_file)
-    xml.parser()
-
-    # Get instructions from XML
-    instructions = xml.get_instructions()
-
-    # Initialize program
-    program = Prog(inputs.input_file)
-
-    # Run program
-    program.run(instructions)
+    try:
+        # Get command line arguments = inputs and check them
+        inputs = InputFiles()
+
+        # Batch of jobs instead of one program
+        if(inputs.batch is not None):
+            sys.exit(inputs.batch.run())
+
+        # Server, or program run by the server
+        if(inputs.server is not None):
+            inputs.server.run()
+            sys.exit(0)
+        if(inputs.client is not None):
+            if(inputs.shutdown):
+                inputs.client.shutdown()
+                sys.exit(0)
+            code, output, errors = inputs.client.run(inputs.source_file.read(), inputs.input_file.read())
+            inputs.output.write(output)
+            inputs.output.flush()
+            sys.stderr.write(errors)
+            sys.exit(code)
+
+        # Parse XML file (or get the program from cache) and run it
+        result = inputs.interpreter.run(inputs.source_file, inputs.input_file, inputs.output).check()
+    except(InterpretError) as error:
+        sys.stderr.write(error.report())
+        sys.exit(error.code)
+    sys.exit(result.exit_code)
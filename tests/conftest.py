@@ -0,0 +1,65 @@
+# IPP 2022/23
+# Tests of the IPPcode23 interpreter
+# Author: Matyas Strelec (xstrel03)
+#
+# Programs are written in IPPcode23 and converted to XML by the converter of the benchmarks,
+# interpret.py runs in a child process, so exit codes and the command line are tested too.
+#
+#   python3 -m pytest -q tests
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'bench'))
+
+from run import Source  # noqa: E402
+
+# Combinations of engines and options which must all give the same output and exit code: every engine
+# with and without optimizer, memoization and statistics, and the other modes with the default engine
+ENGINES = [[engine] + optimize + memoize + stats
+           for engine in ['--engine=interpret', '--engine=compiled', '--engine=aot']
+           for optimize in [[], ['--no-optimize']]
+           for memoize in [[], ['--memoize']]
+           for stats in [[], ['--stats=STATS']]]
+ENGINES += [['--engine=interpret', '--tiered'], ['--engine=compiled', '--tiered'], ['--gf-slots'], ['--stream']]
+
+
+# Result of one run of interpret.py
+class Run:
+    def __init__(self, code, stdout, stderr):
+        self.code = code
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+# Runs IPPcode23 programs, --stats=STATS is replaced by a file in the temporary directory
+class Interpreter:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, program, args=(), input_data='', timeout=30):
+        source = os.path.join(self.directory, 'program.xml')
+        with open(source, 'w') as file:
+            file.writelines(Source.to_xml(program.strip().splitlines()))
+        data = os.path.join(self.directory, 'program.in')
+        with open(data, 'w') as file:
+            file.write(input_data)
+
+        stats = os.path.join(self.directory, 'stats.txt')
+        args = [arg.replace('STATS', stats) for arg in args]
+        command = [sys.executable, os.path.join(REPO_DIR, 'interpret.py'), '--source', source, '--input', data] + args
+        process = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        return Run(process.returncode, process.stdout, process.stderr)
+
+
+@pytest.fixture
+def interpret(tmp_path):
+    return Interpreter(str(tmp_path))
@@ -0,0 +1,262 @@
+# IPP 2022/23
+# Tests of the IPPcode23 interpreter - all engines and options give the same results
+# Author: Matyas Strelec (xstrel03)
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+import pytest
+
+from conftest import ENGINES
+
+# Name, program, input, expected output and exit code
+PROGRAMS = [
+    ('sum', '''
+.IPPcode23
+DEFVAR GF@i
+DEFVAR GF@sum
+DEFVAR GF@cond
+MOVE GF@i int@0
+MOVE GF@sum int@0
+LABEL loop
+ADD GF@i GF@i int@1
+ADD GF@sum GF@sum GF@i
+LT GF@cond GF@i int@1000
+JUMPIFEQ loop GF@cond bool@true
+WRITE GF@sum
+''', '', '500500', 0),
+
+    ('recursion', '''
+.IPPcode23
+DEFVAR GF@n
+DEFVAR GF@result
+MOVE GF@n int@0
+LABEL next
+PUSHS GF@n
+CALL fib
+POPS GF@result
+WRITE GF@result
+WRITE string@\\032
+ADD GF@n GF@n int@1
+JUMPIFNEQ next GF@n int@15
+EXIT int@0
+
+LABEL fib
+CREATEFRAME
+PUSHFRAME
+DEFVAR LF@n
+DEFVAR LF@a
+DEFVAR LF@b
+POPS LF@n
+LT LF@a LF@n int@2
+JUMPIFEQ small LF@a bool@true
+SUB LF@a LF@n int@1
+PUSHS LF@a
+CALL fib
+POPS LF@a
+SUB LF@b LF@n int@2
+PUSHS LF@b
+CALL fib
+POPS LF@b
+ADD LF@a LF@a LF@b
+PUSHS LF@a
+POPFRAME
+RETURN
+LABEL small
+PUSHS LF@n
+POPFRAME
+RETURN
+''', '', '0 1 1 2 3 5 8 13 21 34 55 89 144 233 377 ', 0),
+
+    ('stack', '''
+.IPPcode23
+DEFVAR GF@i
+DEFVAR GF@x
+MOVE GF@i int@0
+LABEL push
+PUSHS GF@i
+ADD GF@i GF@i int@1
+JUMPIFNEQ push GF@i int@10
+POPS GF@x
+POPS GF@i
+SUB GF@x GF@x GF@i
+WRITE GF@x
+POPS GF@x
+POPS GF@x
+WRITE GF@x
+''', '', '16', 0),
+
+    ('strings', '''
+.IPPcode23
+DEFVAR GF@s
+DEFVAR GF@c
+DEFVAR GF@n
+DEFVAR GF@i
+MOVE GF@s string@a
+MOVE GF@i int@0
+LABEL build
+CONCAT GF@s GF@s string@ab
+ADD GF@i GF@i int@1
+JUMPIFNEQ build GF@i int@3000
+SETCHAR GF@s int@5000 string@Z
+GETCHAR GF@c GF@s int@5000
+STRLEN GF@n GF@s
+WRITE GF@n
+WRITE GF@c
+STRI2INT GF@n GF@s int@5001
+WRITE GF@n
+TYPE GF@c GF@s
+WRITE GF@c
+''', '', '6001Z97string', 0),
+
+    ('read', '''
+.IPPcode23
+DEFVAR GF@a
+DEFVAR GF@b
+DEFVAR GF@t
+READ GF@a int
+READ GF@b string
+READ GF@t bool
+WRITE GF@a
+WRITE GF@b
+WRITE GF@t
+READ GF@a int
+TYPE GF@t GF@a
+WRITE GF@t
+''', '42\nhello\ntrue\n', '42hellotruenil', 0),
+
+    ('frames', '''
+.IPPcode23
+CREATEFRAME
+DEFVAR TF@x
+MOVE TF@x int@7
+PUSHFRAME
+CREATEFRAME
+DEFVAR TF@x
+MOVE TF@x LF@x
+ADD TF@x TF@x int@1
+WRITE LF@x
+WRITE TF@x
+POPFRAME
+WRITE TF@x
+''', '', '787', 0),
+
+    ('wrong type', '''
+.IPPcode23
+DEFVAR GF@a
+MOVE GF@a string@x
+ADD GF@a GF@a int@1
+''', '', '', 53),
+
+    ('missing value', '''
+.IPPcode23
+DEFVAR GF@a
+POPS GF@a
+''', '', '', 56),
+
+    ('undefined variable', '''
+.IPPcode23
+DEFVAR GF@a
+MOVE GF@a int@1
+ADD GF@b GF@a int@1
+''', '', '', 54),
+
+    # Types of variables flow through a folded jump to a label, ADD must not be specialized for int
+    ('folded jump', '''
+.IPPcode23
+DEFVAR GF@n
+DEFVAR GF@x
+DEFVAR GF@r
+DEFVAR GF@i
+MOVE GF@i int@0
+READ GF@n int
+JUMPIFEQ A GF@n int@1
+MOVE GF@x int@1
+JUMP M
+LABEL A
+MOVE GF@x string@s
+JUMPIFEQ B int@1 int@1
+LABEL B
+JUMP M
+LABEL M
+ADD GF@r GF@x int@1
+ADD GF@i GF@i int@1
+JUMPIFNEQ M GF@i int@5
+WRITE GF@r
+''', '1\n', '', 53),
+
+    ('folded jump not taken', '''
+.IPPcode23
+DEFVAR GF@n
+DEFVAR GF@x
+DEFVAR GF@r
+DEFVAR GF@i
+MOVE GF@i int@0
+READ GF@n int
+JUMPIFEQ A GF@n int@1
+MOVE GF@x int@1
+JUMP M
+LABEL A
+MOVE GF@x string@s
+JUMPIFEQ B int@1 int@1
+LABEL B
+JUMP M
+LABEL M
+ADD GF@r GF@x int@1
+ADD GF@i GF@i int@1
+JUMPIFNEQ M GF@i int@5
+WRITE GF@r
+''', '0\n', '2', 0),
+
+    # TYPE gives a type name, which is not a string for JUMPIFNEQ (same as in the original interpreter)
+    ('type name', '''
+.IPPcode23
+DEFVAR GF@t
+TYPE GF@t int@1
+JUMPIFNEQ end GF@t string@int
+LABEL end
+WRITE string@ok
+''', '', '', 53),
+
+    ('division by zero', '''
+.IPPcode23
+DEFVAR GF@a
+MOVE GF@a int@0
+IDIV GF@a int@1 GF@a
+''', '', '', 57),
+]
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+@pytest.mark.parametrize('name, program, input_data, output, code', PROGRAMS, ids=[program[0] for program in PROGRAMS])
+def test_engines(interpret, args, name, program, input_data, output, code):
+    run = interpret(program, args, input_data)
+    assert (run.code, run.stdout) == (code, output), run.stderr
+
+
+# Long strings changed by CONCAT are kept in StringBuffer, they compare equal to String of the same text
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_long_string_compare(interpret, args):
+    program = '''
+.IPPcode23
+DEFVAR GF@s
+DEFVAR GF@t
+DEFVAR GF@i
+MOVE GF@s string@x
+MOVE GF@i int@0
+LABEL double
+CONCAT GF@s GF@s GF@s
+ADD GF@i GF@i int@1
+JUMPIFNEQ double GF@i int@12
+MOVE GF@t string@%s
+JUMPIFNEQ wrong GF@s GF@t
+JUMPIFNEQ wrong GF@t GF@s
+JUMPIFEQ equal GF@s GF@t
+LABEL wrong
+WRITE string@wrong
+EXIT int@0
+LABEL equal
+EQ GF@i GF@t GF@s
+WRITE GF@i
+''' % ('x' * 4096)
+    run = interpret(program, args)
+    assert (run.code, run.stdout) == (0, 'true'), run.stderr
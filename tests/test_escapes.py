@@ -0,0 +1,49 @@
+# IPP 2022/23
+# Tests of the IPPcode23 interpreter - escape sequences in strings
+# Author: Matyas Strelec (xstrel03)
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+import random
+
+import pytest
+
+from interpret import Helper
+
+
+@pytest.mark.parametrize('string, decoded', [
+    ('abc', 'abc'),
+    ('a\\032b', 'a b'),
+    ('\\035\\092\\010', '#\\\n'),
+    # Backslash decoded from \092 does not start another escape sequence
+    ('\\092032', '\\032'),
+    ('\\092\\092035', '\\\\035'),
+    # Backslash not followed by three digits is kept
+    ('a\\b', 'a\\b'),
+    ('\\\\032', '\\ '),
+    ('a\\03', 'a\\03'),
+    ('end\\', 'end\\'),
+    ('\\12x\\123', '\\12x{'),
+])
+def test_decode(string, decoded):
+    assert Helper.string_escape(string) == decoded
+    # Long strings are not cached
+    assert Helper.string_escape(string * 100) == decoded * 100
+
+
+# Decoding by one pass is the same as decoding the sequences one by one from left to right
+def test_random():
+    rand = random.Random(0)
+    for _ in range(2000):
+        string = ''.join(rand.choice(['\\', '0', '9', '2', '3', 'a', ' ']) for _ in range(rand.randrange(12)))
+        expected = ''
+        index = 0
+        while(index < len(string)):
+            code = string[index+1:index+4]
+            if(string[index] == '\\' and len(code) == 3 and code.isdecimal()):
+                expected += chr(int(code))
+                index += 4
+            else:
+                expected += string[index]
+                index += 1
+        assert Helper.string_escape(string) == expected
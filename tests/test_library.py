@@ -0,0 +1,68 @@
+# IPP 2022/23
+# Tests of the IPPcode23 interpreter - library interface
+# Author: Matyas Strelec (xstrel03)
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+import io
+import json
+
+import pytest
+
+from run import Source
+from interpret import Interpreter, Optimizer, Stats, TYPED
+
+PROGRAM = '''
+.IPPcode23
+DEFVAR GF@i
+MOVE GF@i int@0
+LABEL loop
+PUSHS GF@i
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@10
+WRITE GF@i
+'''
+
+
+def xml(program):
+    return ''.join(Source.to_xml(program.strip().splitlines())).encode()
+
+
+# Every run has its own statistics
+def test_stats_of_runs():
+    file = io.StringIO()
+    interpreter = Interpreter(stats=Stats(file, 'json'))
+    for _ in range(3):
+        output = io.StringIO()
+        result = interpreter.run(xml(PROGRAM), output=output)
+        assert (result.exit_code, output.getvalue()) == (0, '10')
+        assert result.counters['executed'] == 35
+        assert result.counters['stack_depth'] == 10
+
+    reports = [json.loads(report) for report in file.getvalue().replace('}\n{', '}\0{').split('\0')]
+    assert len(reports) == 3
+    for report in reports:
+        assert (report['instructions'], report['max_stack_depth'], report['initialized_variables']) == (35, 10, 1)
+
+
+# Instruction specialized by a mistake of the type inference reports the error of the original instruction
+# (operands which Python can still compare, e.g. with JUMPIFEQ, are not detected)
+@pytest.mark.parametrize('engine', ['interpret', 'compiled', 'aot'])
+@pytest.mark.parametrize('opcode, value, code', [('ADD', 'string@s', 53), ('LT', 'string@s', 53),
+                                                 ('ADD', 'nil@nil', 53), ('ADD', None, 53)])
+def test_wrong_types(engine, opcode, value, code):
+    program = """
+.IPPcode23
+DEFVAR GF@x
+DEFVAR GF@y
+%s
+LABEL loop
+%s GF@y GF@x int@1
+JUMP loop
+""" % ('' if value is None else 'MOVE GF@x ' + value, opcode)
+    loaded = Interpreter(engine=engine).load(xml(program))
+    instructions = loaded.instructions
+    index = [i for i in range(len(instructions)) if instructions[i].opcode == opcode][0]
+    instructions[index] = TYPED([instructions[index]], Optimizer._typed[opcode])
+    result = Interpreter(engine=engine).run(loaded)
+    assert result.exit_code == code, result.error
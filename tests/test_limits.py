@@ -0,0 +1,120 @@
+# IPP 2022/23
+# Tests of the IPPcode23 interpreter - limits of resources
+# Author: Matyas Strelec (xstrel03)
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+import json
+import time
+
+import pytest
+
+from conftest import ENGINES
+
+COUNTER = '''
+.IPPcode23
+DEFVAR GF@i
+MOVE GF@i int@0
+LABEL loop
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@1000
+WRITE GF@i
+'''
+
+PUSHES = '''
+.IPPcode23
+LABEL loop
+PUSHS int@1
+JUMP loop
+'''
+
+RECURSION = '''
+.IPPcode23
+LABEL f
+CALL f
+'''
+
+# Strings of 8M characters made from the same prefix, every CONCAT takes milliseconds
+CONCATS = '''
+.IPPcode23
+DEFVAR GF@s
+DEFVAR GF@t
+DEFVAR GF@i
+MOVE GF@s string@x
+MOVE GF@i int@0
+LABEL double
+CONCAT GF@s GF@s GF@s
+ADD GF@i GF@i int@1
+JUMPIFNEQ double GF@i int@23
+MOVE GF@i int@0
+LABEL loop
+CONCAT GF@t GF@s string@y
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@3000
+'''
+
+# Doubling string, every CONCAT takes twice as long as the previous one
+DOUBLING = '''
+.IPPcode23
+DEFVAR GF@s
+MOVE GF@s string@x
+LABEL double
+CONCAT GF@s GF@s GF@s
+JUMP double
+'''
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_instructions(interpret, args):
+    # 3 instructions before the loop, 2 in each iteration (the LABEL is jumped over) and the WRITE
+    assert interpret(COUNTER, args + ['--max-instructions=2004']).stdout == '1000'
+    run = interpret(COUNTER, args + ['--max-instructions=2003'])
+    assert (run.code, run.stdout) == (60, '')
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_stack(interpret, args):
+    assert interpret(PUSHES, args + ['--max-stack=100']).code == 62
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_calls(interpret, args):
+    assert interpret(RECURSION, args + ['--max-calls=100']).code == 63
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_memory(interpret, args):
+    assert interpret(PUSHES, args + ['--max-memory=1000000']).code == 64
+
+
+@pytest.mark.parametrize('program', [CONCATS, DOUBLING], ids=['concats', 'doubling'])
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_timeout(interpret, args, program):
+    start = time.monotonic()
+    run = interpret(program, args + ['--timeout=0.5'])
+    assert run.code == 61, run.stderr
+    assert time.monotonic() - start < 10
+
+
+# Statistics are written also when the run ends by a limit
+def test_stats(interpret, tmp_path):
+    run = interpret(COUNTER, ['--stats=STATS', '--stats-format=json', '--max-instructions=1000'])
+    assert run.code == 60
+    report = json.loads((tmp_path / 'stats.txt').read_text())
+    assert report['instructions'] <= 1001
+
+
+FRAMES = '''
+.IPPcode23
+LABEL f
+CREATEFRAME
+PUSHFRAME
+CALL f
+'''
+
+
+# Calls and frames take memory, also without any values
+@pytest.mark.parametrize('program', [RECURSION, FRAMES], ids=['calls', 'frames'])
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_memory_calls(interpret, args, program):
+    assert interpret(program, args + ['--max-memory=1000000']).code == 64
@@ -0,0 +1,84 @@
+# IPP 2022/23
+# Tests of the IPPcode23 interpreter - long strings kept in StringBuffer
+# Author: Matyas Strelec (xstrel03)
+
+# ------------------–------------------–------------------–------------------–------------------ #
+
+import random
+
+import pytest
+
+from conftest import ENGINES
+from interpret import String, StringBuffer
+
+
+# Strings made by random CONCATs and SETCHARs of older values keep their text
+@pytest.mark.parametrize('seed', range(5))
+def test_older_values(seed):
+    rand = random.Random(seed)
+    values = [String('x' * String.BUFFER_LENGTH)]
+    texts = [values[0].data]
+    for _ in range(300):
+        i = rand.randrange(len(values)) if rand.random() < 0.3 else len(values) - 1
+        if(rand.random() < 0.5):
+            text = rand.choice(['a', 'bc', texts[0]])
+            value = String.concat(values[i], String(text))
+            texts.append(texts[i] + text)
+        else:
+            index = rand.randrange(len(texts[i]))
+            value = String.setchar(values[i], index, 'Z')
+            texts.append(texts[i][0:index] + 'Z' + texts[i][index+1:])
+        values.append(value)
+        # Text of some values is read in between
+        if(rand.random() < 0.2):
+            j = rand.randrange(len(values))
+            assert values[j].data == texts[j]
+        assert String.length(value) == len(texts[-1])
+
+    for i in rand.sample(range(len(values)), len(values)):
+        assert values[i].data == texts[i]
+        assert String.char(values[i], len(texts[i]) - 1) == texts[i][-1]
+
+
+# Strings made from the same older value do not split its text to a list again
+def test_shared_prefix():
+    prefix = String.concat(String('x' * String.BUFFER_LENGTH), String('y'))
+    newer = String.concat(prefix, String('z'))
+    assert newer.__class__ is StringBuffer
+    for _ in range(3):
+        value = String.concat(prefix, String('y'))
+        assert value.__class__ is StringBuffer and value._chars.__class__ is str
+        assert value.data == 'x' * String.BUFFER_LENGTH + 'yy'
+    assert newer.data == 'x' * String.BUFFER_LENGTH + 'yz'
+
+
+@pytest.mark.parametrize('args', ENGINES, ids=' '.join)
+def test_shared_prefix_program(interpret, args):
+    program = '''
+.IPPcode23
+DEFVAR GF@s
+DEFVAR GF@t
+DEFVAR GF@i
+MOVE GF@s string@x
+MOVE GF@i int@0
+LABEL double
+CONCAT GF@s GF@s GF@s
+ADD GF@i GF@i int@1
+JUMPIFNEQ double GF@i int@13
+LABEL loop
+CONCAT GF@t GF@s string@y
+SETCHAR GF@t int@0 string@z
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@50
+SETCHAR GF@s int@1 string@w
+STRLEN GF@i GF@t
+WRITE GF@i
+GETCHAR GF@t GF@t int@0
+WRITE GF@t
+GETCHAR GF@t GF@s int@0
+WRITE GF@t
+GETCHAR GF@t GF@s int@1
+WRITE GF@t
+'''
+    run = interpret(program, args)
+    assert (run.code, run.stdout) == (0, '8193zxw'), run.stderr